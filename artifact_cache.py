@@ -0,0 +1,103 @@
+import contextlib
+import threading
+import hashlib
+import shutil
+import json
+import os
+
+# keeps build artifacts (the executable) around, keyed by the hash of everything that went into making them
+# the least recently used ones get evicted once the cache grows past `max_bytes`
+# can be used from multiple threads, and by multiple processes sharing the folder (the daemon and the command line)
+
+FILE_STATS = 'stats.json'
+FOLDER_INCOMPLETE = 'incomplete' # where `put` writes the artifacts before moving them in, out of the way of `evict`
+
+class ArtifactCache:
+
+    def __init__(self, folder:str, max_bytes:int) -> None:
+        self.folder = folder
+        self.max_bytes = max_bytes
+
+        os.makedirs(os.path.join(self.folder, FOLDER_INCOMPLETE), exist_ok=True)
+
+        self.lock = threading.Lock() # for the counters and the eviction
+
+        self.hits = 0
+        self.misses = 0
+        try:
+            with open(os.path.join(self.folder, FILE_STATS)) as f:
+                stats = json.load(f)
+            self.hits = stats['hits']
+            self.misses = stats['misses']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    # `inputs` are the files that the artifact is built from
+    def key(self, inputs:list[str], flags:list[str], compiler_version:str) -> str:
+        ret = hashlib.sha256()
+        for arg in flags + [compiler_version]:
+            ret.update(arg.encode())
+            ret.update(b'\0')
+        for file in inputs:
+            with open(file, 'rb') as f:
+                ret.update(hashlib.sha256(f.read()).digest())
+        return ret.hexdigest()
+
+    # copies the artifact to `dest`, returns False if there is none
+    def get(self, key:str, dest:str) -> bool:
+        path = os.path.join(self.folder, key)
+
+        try:
+            # once it's open, it can get evicted (by another process) without it affecting the copy
+            with open(path, 'rb') as f_src, open(dest, 'wb') as f_dest:
+                os.utime(f_src.fileno()) # the mtime is what the eviction goes by
+                shutil.copyfileobj(f_src, f_dest)
+                os.chmod(f_dest.fileno(), os.fstat(f_src.fileno()).st_mode)
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+                self.save_stats()
+            return False
+
+        with self.lock:
+            self.hits += 1
+            self.save_stats()
+        return True
+
+    def put(self, key:str, src:str) -> None:
+        path = os.path.join(self.folder, key)
+        path_tmp = os.path.join(self.folder, FOLDER_INCOMPLETE, f'{key}.{os.getpid()}.{threading.get_ident()}')
+        shutil.copy2(src, path_tmp)
+        os.replace(path_tmp, path)
+        os.utime(path)
+
+        with self.lock:
+            evict(self.folder, self.max_bytes)
+
+    def save_stats(self) -> None:
+        with open(os.path.join(self.folder, FILE_STATS), 'w') as f:
+            json.dump({'hits': self.hits, 'misses': self.misses}, f)
+
+# removes the least recently modified files in `folder` until they all fit in `max_bytes`
+# (subfolders, like `FOLDER_INCOMPLETE`, don't count); also used by `FnCache`
+def evict(folder:str, max_bytes:int) -> None:
+    entries = []
+    total = 0
+    with os.scandir(folder) as it:
+        for entry in it:
+            if entry.name == FILE_STATS or not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue # evicted by another process
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+    entries.sort()
+    for _mtime, size, path in entries:
+        if total <= max_bytes:
+            break
+        with contextlib.suppress(FileNotFoundError): # same
+            os.remove(path)
+        total -= size
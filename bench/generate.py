@@ -0,0 +1,98 @@
+#! /usr/bin/env python3
+
+# generates synthetic yasl programs, for benchmarking the compiler
+# the programs compile (with gcc as well), but are not meant to be run
+# usage: bench/generate.py [output file] [fns] [fn@s] [statements per fn] [scope depth] [strings per fn] [calls per fn]
+
+import sys
+
+class Knobs:
+
+    __slots__ = ('fns', 'decls', 'statements', 'depth', 'strings', 'fanout')
+
+    # `fns` - number of `fn`s (not counting `main`)
+    # `decls` - number of extra `fn@`s, none of which get called
+    # `statements` - statements per `fn` body (roughly)
+    # `depth` - how deep the scopes in each `fn` body are nested
+    # `strings` - string literals per `fn` body
+    # `fanout` - how many of the previous `fn`s each `fn` calls
+    def __init__(self, fns:int=100, decls:int=100, statements:int=20, depth:int=2, strings:int=1, fanout:int=2) -> None:
+        self.fns = fns
+        self.decls = decls
+        self.statements = statements
+        self.depth = depth
+        self.strings = strings
+        self.fanout = fanout
+
+    def to_str(self) -> str:
+        return f'fns={self.fns} decls={self.decls} statements={self.statements} depth={self.depth} strings={self.strings} fanout={self.fanout}'
+
+def generate(knobs:Knobs) -> str:
+    code = [
+        'fn@ printf:int (const char *restrict format, ...)\n',
+        'fn@ rand:int []\n',
+    ]
+
+    for idx in range(knobs.decls):
+        code.append(f'fn@ ext{idx}:int (int a, int b)\n')
+
+    for idx in range(knobs.fns):
+        generate_fn(code, idx, knobs)
+
+    code.append('fn main:int []\n{\n    var x:int rand[]\n')
+    called = [knobs.fns - 1] if knobs.fanout > 0 else range(knobs.fns)
+    for callee in called:
+        if callee >= 0:
+            code.append(f'    inc x f{callee}[x 1]\n')
+    code.append('    ret x\n}\n')
+
+    return ''.join(code)
+
+def generate_fn(code:list[str], idx:int, knobs:Knobs) -> None:
+    code.append(f'fn f{idx}:int [a:int b:int]\n{{\n')
+    code.append('    var x:int a\n')
+    code.append('    inc x b\n')
+
+    statements = max(knobs.statements - 3 - knobs.strings - knobs.fanout, 0)
+    per_scope = statements // (knobs.depth + 1)
+
+    # each scope has its own variable, that gets added to `x` at the end of it
+    for depth in range(knobs.depth + 1):
+        indent = '    ' * (depth + 1)
+        if depth > 0:
+            code.append(f'{"    " * depth}{{\n')
+            code.append(f'{indent}var y{depth}:int b\n')
+        for st_idx in range(per_scope):
+            if depth > 0 and st_idx % 2:
+                code.append(f'{indent}dec y{depth} 1\n')
+            else:
+                code.append(f'{indent}inc x {"a" if st_idx % 3 else "b"}\n')
+
+    for depth in range(knobs.depth, 0, -1):
+        code.append(f'{"    " * (depth + 1)}inc x y{depth}\n')
+        code.append(f'{"    " * depth}}}\n')
+
+    for str_idx in range(knobs.strings):
+        code.append(f'    printf[\'f{idx} string {str_idx}: %d\\n\' x]\n')
+
+    for call_idx in range(knobs.fanout):
+        callee = idx - 1 - call_idx
+        if callee < 0:
+            break
+        code.append(f'    val c{call_idx}:int f{callee}[x b]\n')
+        code.append(f'    inc x c{call_idx}\n')
+
+    code.append('    ret x\n}\n')
+
+def main() -> None:
+    args = [int(arg) for arg in sys.argv[2:]]
+    code = generate(Knobs(*args))
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'w') as f:
+            f.write(code)
+    else:
+        sys.stdout.write(code)
+
+if __name__ == '__main__':
+    main()
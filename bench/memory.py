@@ -0,0 +1,69 @@
+#! /usr/bin/env python3
+
+# reports how much memory the front end needs per parsed statement (the syntax tree is kept until the end)
+# usage: bench/memory.py [number of functions] [statements per function]
+
+import tracemalloc
+import tempfile
+import sys
+import os
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+# pylint: disable=wrong-import-position
+from yasl import Src
+from codegen import CodeGen
+
+# returns the source and the number of statements in it
+def generate(fns:int, statements:int) -> tuple[str, int]:
+    code = ['fn@ printf:int (const char *restrict format, ...)\n']
+    count = 0
+
+    for fn_idx in range(fns):
+        code.append(f'fn f{fn_idx}:int [a:int b:int]\n{{\n')
+
+        for st_idx in range(0, statements - 1, 4):
+            var = f'v{fn_idx}-{st_idx}'
+            code.append(f'    var {var}:int a\n')
+            code.append(f'    inc {var} b\n')
+            if fn_idx > 0:
+                code.append(f'    dec {var} f{fn_idx-1}[{var} b]\n')
+            else:
+                code.append(f'    dec {var} 1\n')
+            code.append(f'    printf[\'{var} = %d\\n\' {var}]\n')
+            count += 4
+
+        code.append('    ret a\n}\n')
+        count += 1
+
+    return ''.join(code), count
+
+def main() -> None:
+    fns = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    statements = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    code, count = generate(fns, statements)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_in = os.path.join(tmp, 'bench.yasl')
+        with open(file_in, 'w') as f:
+            f.write(code)
+
+        tracemalloc.start()
+
+        with Src(file_in) as src:
+            program = src.pop_program()
+            retained, peak = tracemalloc.get_traced_memory()
+
+        with CodeGen(os.path.join(tmp, 'code.c'), os.path.join(tmp, 'code_pool.h')) as codegen:
+            codegen.gen_program(program)
+
+        tracemalloc.stop()
+
+    print(f'statements: {count}')
+    print(f'peak: {peak} bytes, {peak / count:.1f} bytes/statement')
+    print(f'retained after parsing: {retained} bytes, {retained / count:.1f} bytes/statement')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+#! /usr/bin/env python3
+
+# measures how fast the compiler goes through generated programs (see `generate.py`) of growing size,
+# for the front end alone (everything up to and including writing out the C) and for the full pipeline (gcc included)
+# and fails if it got slower, or needs more memory, than the stored baseline
+# the speed gets compared relative to how fast the machine is (see `calibrate`), so that the baseline can be made on
+# one machine and checked on another; it's still only a rough comparison, regenerate the baseline when in doubt
+# usage: bench/throughput.py [--save-baseline]
+
+from typing import Callable
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import tracemalloc
+import resource
+import tempfile
+import time
+import json
+import sys
+import io
+import os
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+# pylint: disable=wrong-import-position
+from yasl import pop_modules
+from yasl import INLINE_THRESHOLD
+from optimize import fold_constants
+from optimize import drop_unreachable_functions
+from optimize import set_linkage
+from codegen import CodeGen
+from artifact_cache import ArtifactCache
+from build import Builder
+from build import BUILD_PROFILES
+from build import GCC_FLAGS
+from build import term
+from build import DEFAULT_BUILD_PROFILE
+from generate import generate
+from generate import Knobs
+
+FILE_BASELINE = os.path.join(HERE, 'baseline.json')
+TOLERANCE = 0.3 # how much worse than the baseline is still fine, machines are noisy
+
+FRONT_END_SIZES = [50, 100, 200, 400] # number of fns
+FULL_PIPELINE_SIZES = [25, 50, 100]
+REPEATS = 3 # the best time gets taken
+
+CALIBRATION_FNS = 200 # size of the program that `calibrate` goes through
+CALIBRATION_C = 'int main(void) { return 0; }\n'
+
+def front_end(file_in:str, tmp:str) -> list[list[str]]:
+    program = pop_modules(file_in, [])
+    fold_constants(program)
+    drop_unreachable_functions(program, [])
+    set_linkage(program, [], INLINE_THRESHOLD)
+
+    sources = [os.path.join(tmp, 'code.c'), os.path.join(tmp, 'code_pool.h')]
+    with CodeGen(sources[0], sources[1]) as codegen:
+        codegen.gen_program(program)
+    return [sources]
+
+def full_pipeline(file_in:str, tmp:str) -> list[list[str]]:
+    sources = front_end(file_in, tmp)
+    gcc_cache = ArtifactCache(os.path.join(tmp, 'gcc_cache'), 0) # evicts everything right away, so gcc always runs
+    builder = Builder(gcc_cache, os.path.join(tmp, 'executable'), os.path.join(tmp, 'pgo'))
+    builder.gcc(BUILD_PROFILES[DEFAULT_BUILD_PROFILE], sources)
+    return sources
+
+# runs in a process of its own, since the peak memory of the children is that of every child the process ever had
+def full_pipeline_peak_memory(file_in:str, tmp:str) -> int:
+    with contextlib.redirect_stderr(io.StringIO()):
+        full_pipeline(file_in, tmp)
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+
+# returns the best time and the peak memory (of this process for the front end, of the gcc processes for the full pipeline)
+def measure(pipeline:Callable[[str,str],list[list[str]]], file_in:str, tmp:str) -> tuple[float, int]:
+    best = float('inf')
+    with contextlib.redirect_stderr(io.StringIO()):
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            pipeline(file_in, tmp)
+            best = min(best, time.perf_counter() - start)
+
+        if pipeline is front_end:
+            tracemalloc.start()
+            pipeline(file_in, tmp)
+            _current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        else:
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                peak = pool.submit(full_pipeline_peak_memory, file_in, tmp).result()
+
+    return best, peak
+
+# returns how many times per second each pipeline's stand-in for the machine's speed runs:
+# plain python going through the lines of a generated program for the front end, and gcc compiling an empty program
+# for the full pipeline (which is mostly gcc)
+def calibrate(tmp:str) -> dict[str,float]:
+    code = generate(Knobs(fns=CALIBRATION_FNS, decls=CALIBRATION_FNS))
+    file_c = os.path.join(tmp, 'calibration.c')
+    with open(file_c, 'w') as f:
+        f.write(CALIBRATION_C)
+
+    def python() -> None:
+        words:dict[str,int] = {}
+        for line in code.splitlines():
+            for word in line.split():
+                words[word] = words.get(word, 0) + 1
+
+    def gcc() -> None:
+        term(['gcc'] + GCC_FLAGS + BUILD_PROFILES[DEFAULT_BUILD_PROFILE] + [file_c, '-o', os.path.join(tmp, 'calibration')])
+
+    ret = {}
+    for name, work in [('front end', python), ('full pipeline', gcc)]:
+        best = float('inf')
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            work()
+            best = min(best, time.perf_counter() - start)
+        ret[name] = 1 / best
+    return ret
+
+def run_cases() -> dict[str,dict[str,float]]:
+    results:dict[str,dict[str,float]] = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_in = os.path.join(tmp, 'bench.yasl')
+        calibration = calibrate(tmp)
+
+        for name, pipeline, sizes in [('front end', front_end, FRONT_END_SIZES), ('full pipeline', full_pipeline, FULL_PIPELINE_SIZES)]:
+            print(f'{name}:')
+            print(f'    {"fns":>6} {"lines":>8} {"time":>10} {"lines/sec":>12} {"vs prev":>8} {"peak memory":>14}')
+
+            prev_time = None
+            for fns in sizes:
+                knobs = Knobs(fns=fns, decls=fns)
+                code = generate(knobs)
+                with open(file_in, 'w') as f:
+                    f.write(code)
+                lines = code.count('\n')
+
+                seconds, peak = measure(pipeline, file_in, tmp)
+
+                scaling = f'{seconds / prev_time:.2f}x' if prev_time is not None else ''
+                prev_time = seconds
+                print(f'    {fns:>6} {lines:>8} {seconds:>9.4f}s {lines / seconds:>12.0f} {scaling:>8} {peak:>14}')
+
+                results[f'{name} {knobs.to_str()}'] = {
+                    'lines/sec': lines / seconds,
+                    'relative speed': lines / seconds / calibration[name], # lines per run of the calibration
+                    'peak memory': peak,
+                }
+
+    return results
+
+# returns the regressions
+def compare(results:dict[str,dict[str,float]], baseline:dict[str,dict[str,float]]) -> list[str]:
+    ret = []
+    for case, base in baseline.items():
+        result = results.get(case)
+        if result is None:
+            ret.append(f'{case}: missing')
+            continue
+        if result['relative speed'] < base['relative speed'] * (1 - TOLERANCE):
+            expected = base['relative speed'] * result['lines/sec'] / result['relative speed'] # on this machine
+            ret.append(f'{case}: {result["lines/sec"]:.0f} lines/sec, baseline is {expected:.0f} for this machine')
+        if result['peak memory'] > base['peak memory'] * (1 + TOLERANCE):
+            ret.append(f'{case}: peak memory {result["peak memory"]:.0f}, baseline is {base["peak memory"]:.0f}')
+    return ret
+
+def main() -> None:
+    results = run_cases()
+
+    if '--save-baseline' in sys.argv[1:]:
+        with open(FILE_BASELINE, 'w') as f:
+            json.dump(results, f, indent=4)
+            f.write('\n')
+        print(f'baseline saved to `{FILE_BASELINE}`')
+        return
+
+    if not os.path.isfile(FILE_BASELINE):
+        print(f'no baseline in `{FILE_BASELINE}`, make one with `--save-baseline`')
+        return
+
+    with open(FILE_BASELINE) as f:
+        baseline = json.load(f)
+
+    regressions = compare(results, baseline)
+    if len(regressions) > 0:
+        print(f'REGRESSION (more than {TOLERANCE:.0%} worse than the baseline):', file=sys.stderr)
+        for regression in regressions:
+            print(f'    {regression}', file=sys.stderr)
+        sys.exit(1)
+
+    print('no regressions')
+
+if __name__ == '__main__':
+    main()
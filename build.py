@@ -0,0 +1,140 @@
+from typing import TextIO
+from concurrent.futures import ThreadPoolExecutor
+import subprocess
+import tempfile
+import shutil
+import time
+import sys
+import os
+
+from artifact_cache import ArtifactCache
+
+# turns the generated C into an executable (and runs it) or into a shared library
+
+NATIVE_FLAG = '-march=native' # what it stands for depends on the machine, see `Builder.native_target`
+
+GCC_FLAGS = ['-Werror', '-Wextra', '-Wall', '-pedantic', '-Wfatal-errors', '-Wshadow', '-fwrapv']
+
+# flags on top of `GCC_FLAGS`
+BUILD_PROFILES = {
+    'debug': ['-O0', '-g'],
+    'release': ['-O3', NATIVE_FLAG, '-flto'],
+    'pgo': ['-O3', NATIVE_FLAG, '-flto'], # built twice, once to collect a profile and once to use it, see `Builder.build`
+}
+DEFAULT_BUILD_PROFILE = 'debug'
+
+SHARED_FLAGS = ['-shared', '-fPIC'] # on top of the profile's, see `Builder.build_shared`
+
+def term(args:list[str]) -> None:
+    subprocess.run(args, check=True)
+
+def term_output(args:list[str]) -> str:
+    return subprocess.run(args, check=True, capture_output=True, text=True).stdout
+
+class Builder:
+
+    # `folder_pgo` is where the profile collected by the training run goes
+    # `out` - where the progress gets reported, None for stderr (gcc's own output always goes to stderr)
+    def __init__(self, gcc_cache:ArtifactCache, executable:str, folder_pgo:str, out:None|TextIO=None) -> None:
+        self.gcc_cache = gcc_cache
+        self.out = sys.stderr if out is None else out
+        self.gcc_version = term_output(['gcc', '--version'])
+        self.gcc_native_target:None|str = None # see `native_target`
+        self.executable = executable
+        self.folder_pgo = folder_pgo
+
+    # runs `gcc args -o output`, unless the output is already in the cache
+    # `inputs` are all the files that affect the output
+    def gcc_cached(self, inputs:list[str], args:list[str], output:str) -> None:
+        cache = self.gcc_cache
+        compiler = self.gcc_version
+        if NATIVE_FLAG in args:
+            compiler += self.native_target() # otherwise a cache shared between machines could hand out code for the wrong cpu
+        key = cache.key(inputs, args, compiler)
+
+        if cache.get(key, output):
+            print(f'INFO: gcc cache hit for `{os.path.basename(output)}` ({cache.hits} hits, {cache.misses} misses)', file=self.out)
+            return
+
+        print(f'INFO: gcc cache miss for `{os.path.basename(output)}` ({cache.hits} hits, {cache.misses} misses)', file=self.out)
+        term(['gcc'] + args + ['-o', output])
+        cache.put(key, output)
+
+    # the options that `NATIVE_FLAG` resolves to on this machine
+    def native_target(self) -> str:
+        if self.gcc_native_target is None:
+            self.gcc_native_target = term_output(['gcc', NATIVE_FLAG, '-Q', '--help=target'])
+        return self.gcc_native_target
+
+    # compiles the translation units into the executable, each unit being the `.c` file followed by what it #includes
+    # multiple units get compiled into objects in parallel, and then linked
+    # `extra_inputs` are any other files that affect the result
+    # `output` - where to put the result, if not in the executable
+    def gcc(self, flags:list[str], sources:list[list[str]], extra_inputs:None|list[str]=None, output:None|str=None) -> None:
+        flags = GCC_FLAGS + flags
+        extra_inputs = extra_inputs or []
+        output = output or self.executable
+
+        if len(sources) == 1:
+            files = sources[0]
+            self.gcc_cached(files + extra_inputs, flags + [files[0]], output)
+            return
+
+        objects = [os.path.splitext(files[0])[0] + '.o' for files in sources]
+
+        def compile_unit(files:list[str], obj:str) -> None:
+            self.gcc_cached(files + extra_inputs, flags + ['-c', files[0]], obj)
+
+        with ThreadPoolExecutor() as pool: # the work is done by the gcc processes, so threads are enough
+            list(pool.map(compile_unit, sources, objects))
+
+        self.gcc_cached(objects + extra_inputs, flags + objects, output)
+
+    # `train_input` is fed to the training run of the `pgo` profile
+    def build(self, profile:str, sources:list[list[str]], train_input:None|str) -> None:
+        flags = BUILD_PROFILES[profile]
+
+        if profile != 'pgo':
+            self.gcc(flags, sources)
+            return
+
+        shutil.rmtree(self.folder_pgo, ignore_errors=True) # gcc would merge the new profile into the old one
+        self.gcc(flags + [f'-fprofile-generate={self.folder_pgo}'], sources)
+
+        self.run(train_input, quiet=True, check=False) # the exit code is up to the program
+
+        profile_data = sorted(os.path.join(folder, file) for folder, _folders, files in os.walk(self.folder_pgo) for file in files)
+        self.gcc(flags + [f'-fprofile-use={self.folder_pgo}'], sources, profile_data)
+
+    # the `pgo` profile is not supported, since there's no executable to do the training run with
+    def build_shared(self, profile:str, sources:list[list[str]], library:str) -> None:
+        assert profile != 'pgo'
+        self.gcc(BUILD_PROFILES[profile] + SHARED_FLAGS, sources, output=library)
+
+    # returns how long it took
+    def run(self, stdin:None|str=None, quiet:bool=False, check:bool=True) -> float:
+        with open(stdin if stdin is not None else os.devnull, 'rb') as f:
+            start = time.perf_counter()
+            subprocess.run([self.executable], check=check, stdin=f, stdout=subprocess.DEVNULL if quiet else None)
+            return time.perf_counter() - start
+
+    # builds and runs with every profile, and prints how long that took
+    # the builds go through an empty cache of their own, so that the times are gcc's and not those of a cache hit
+    def compare_profiles(self, sources:list[list[str]], train_input:None|str) -> None:
+        times:dict[str,tuple[float,float]] = {} # profile -> build time, run time
+
+        with tempfile.TemporaryDirectory() as folder:
+            builder = Builder(ArtifactCache(folder, self.gcc_cache.max_bytes), self.executable, self.folder_pgo, self.out)
+
+            for profile in BUILD_PROFILES:
+                start = time.perf_counter()
+                builder.build(profile, sources, train_input)
+                build_time = time.perf_counter() - start
+
+                times[profile] = build_time, builder.run(train_input, quiet=True, check=False)
+
+        _build_time, baseline = times[DEFAULT_BUILD_PROFILE]
+
+        print(f'{"profile":<10} {"build":>10} {"run":>10} {"speedup":>10}', file=self.out)
+        for profile, (build_time, run_time) in times.items():
+            print(f'{profile:<10} {build_time:>9.3f}s {run_time:>9.3f}s {baseline / run_time:>9.2f}x', file=self.out)
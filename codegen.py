@@ -0,0 +1,243 @@
+from typing import Any
+import os
+
+from parser_types import *
+from optimize import split_program
+import stats
+
+# walks the syntax tree built by `Src` and writes out the C code
+
+INDENT = '    '
+
+FILE_OUTPUT = 'code.c'
+FILE_OUTPUT_POOL = 'code_pool.h' # needs to be in the same folder as the `.c` file
+FILE_OUTPUT_HEADER = 'code.h' # shared by the translation units, when there's more than one
+
+class CodeGen:
+
+    # `pretty` indents the code, otherwise every line starts at column 0 (which gcc doesn't care about)
+    # `header` gets #included at the very top, see `gen_header`
+    def __init__(self, file_out:str, file_pool:None|str, pretty:bool=True, header:None|str=None) -> None:
+        self.file_out = open(file_out, 'w')
+
+        if header is not None:
+            self.file_out.write(f'#include "{os.path.basename(header)}"\n')
+
+        # anything that needs to be declared at file scope before the code that uses it
+        # (like the autogenerated string variables) goes into the pool, which is #included at the top
+        # the headers don't have one
+        self.file_pool = None
+        if file_pool is not None:
+            self.file_pool = open(file_pool, 'w')
+            self.file_out.write(f'#include "{os.path.basename(file_pool)}"\n')
+
+        self.pretty = pretty
+        self.depth = 0 # of the nested blocks, the fn body being 1
+
+    def __enter__(self) -> 'CodeGen':
+        return self
+
+    def __exit__(self, exc_type:Any, exc_val:Any, exc_tb:Any) -> None:
+        stats.counters[stats.CNT_BYTES_EMITTED] += self.file_out.tell()
+        self.file_out.close()
+        if self.file_pool is not None:
+            stats.counters[stats.CNT_BYTES_EMITTED] += self.file_pool.tell()
+            self.file_pool.close()
+
+    def write_ccode(self, code:CCode) -> None:
+        self.file_out.writelines(code.fragments())
+
+    def write_ccode_pool(self, code:CCode) -> None:
+        assert self.file_pool is not None
+        self.file_pool.writelines(code.fragments())
+
+    def write_indent(self) -> None:
+        if self.pretty:
+            self.file_out.write(INDENT * self.depth)
+
+    # top level
+
+    def gen_program(self, program:Program) -> None:
+        for item in program.items:
+            match item:
+                case FnDefinition():
+                    self.gen_fn_definition(item)
+                case FnDeclaration():
+                    self.gen_fn_declaration(item)
+
+    # the shared header of a program that's been split into multiple translation units:
+    # the `fn@` prototypes, and the prototypes of the `fn`s that are visible to the other units
+    def gen_header(self, program:Program) -> None:
+        declared = {item.signature.name.to_str() for item in program.items if isinstance(item, FnDeclaration)}
+
+        for item in program.items:
+            match item:
+                case FnDefinition():
+                    if not item.static and item.signature.name.to_str() not in declared:
+                        self.gen_fn_prototype(item)
+                case FnDeclaration():
+                    self.gen_fn_declaration(item)
+
+    def gen_fn_definition(self, fn:FnDefinition) -> None:
+        for name, rawvalue in fn.strings:
+            var = self.gen_ccode_var(name, TYPE_COMPTIME_STR, Value(Var(rawvalue, TYPE_COMPTIME_STR))) # var and not val since in the future we might actually want to edit that (pass it's address)
+            var.prepend(CCode('static '))
+            self.write_ccode_pool(var)
+
+        self.gen_fn_head(fn)
+
+        self.write_ccode(CCode('\n{\n'))
+        self.gen_code_block(fn.body)
+        self.write_ccode(CCode('}\n'))
+
+    def gen_fn_prototype(self, fn:FnDefinition) -> None:
+        self.gen_fn_head(fn)
+        self.write_ccode(CC_SEMICOLON_NL)
+
+    def gen_fn_head(self, fn:FnDefinition) -> None:
+        sig = fn.signature
+
+        if fn.static:
+            self.write_ccode(CC_STATIC_SPACE)
+        if fn.inline:
+            self.write_ccode(CC_INLINE_SPACE)
+        if fn.unused:
+            self.write_ccode(CC_UNUSED_SPACE)
+        if sig.can_ret_err:
+            self.write_ccode(CC_WARNUNUSEDRESULT_SPACE) # `-Wunused-result` doesn't do the trick
+        self.write_ccode(sig.return_type.to_ccode())
+        self.write_ccode(CC_SPACE)
+        self.write_ccode(sig.name.to_ccode())
+        self.write_ccode(fn.args.to_ccode())
+
+    def gen_fn_declaration(self, fn:FnDeclaration) -> None:
+        sig = fn.signature
+
+        if sig.can_ret_err:
+            self.write_ccode(CC_WARNUNUSEDRESULT_SPACE)
+        self.write_ccode(sig.return_type.to_ccode())
+        self.write_ccode(CC_SPACE)
+        self.write_ccode(sig.name.to_ccode())
+        self.write_ccode(fn.args) # we could have used `()` but unfortunately this doesnt work for stdlib fncs (line printf)
+        self.write_ccode(CC_SEMICOLON_NL)
+
+    # statements, each one gets written out as soon as it's generated
+
+    def gen_code_block(self, block:CodeBlock) -> None:
+        self.depth += 1
+        for statement in block.statements:
+            self.gen_statement(statement)
+        self.depth -= 1
+
+    def gen_statement(self, statement:Statement) -> None:
+        self.write_indent()
+
+        match statement:
+
+            case StRet():
+                ret = CCode('return ')
+                ret += statement.value.to_ccode()
+                ret += CC_SEMICOLON_NL
+                self.write_ccode(ret)
+
+            case StVar():
+                self.write_ccode(self.gen_ccode_var(statement.name, statement.typ, statement.value, const=statement.const))
+
+            case StIncDec():
+                ret = CCode('')
+                ret += statement.name.to_ccode()
+                ret += CCode('+=') if statement.inc else CCode('-=')
+                ret += statement.value.to_ccode()
+                ret += CC_SEMICOLON_NL
+                self.write_ccode(ret)
+
+            case StCast():
+                ret = CCode('') # TODO and what if it needs to be a constant ?
+                ret += statement.c_type
+                ret += CC_SPACE
+                ret += statement.name.to_ccode()
+                ret += CC_ASSIGN
+                ret += CC_OB
+                ret += statement.c_type
+                ret += CC_CB
+                ret += statement.value.to_ccode()
+                ret += CC_SEMICOLON_NL
+                self.write_ccode(ret)
+
+            case StIf():
+                ret = CCode('if ')
+                ret += CC_OB
+                ret += statement.cond.to_ccode()
+                ret += CC_CB
+                ret += CC_SPACE
+                ret += CC_CBO
+                ret += CC_NL
+                self.write_ccode(ret)
+
+                self.gen_code_block(statement.body)
+
+                self.write_indent()
+                ret = CCode('')
+                ret += CC_CBC
+                ret += CC_NL
+                self.write_ccode(ret)
+
+            case StScope():
+                ret = CCode('')
+                ret += CC_CBO
+                ret += CC_NL
+                self.write_ccode(ret)
+
+                self.gen_code_block(statement.body)
+
+                self.write_indent()
+                ret = CCode('')
+                ret += CC_CBC
+                ret += CC_NL
+                self.write_ccode(ret)
+
+            case StFnCall():
+                ret = statement.call.to_ccode()
+                ret += CC_SEMICOLON_NL
+                self.write_ccode(ret)
+
+    # misc
+
+    def gen_ccode_var(self, name:VarName, typ:Type, value:Value, const:bool=False) -> CCode:
+        const_prefix = CCode('const ') if const else CCode('') # TODO you can't make gcc raise a warning if a variable was declared without const but was not modified, so we need to do something about this in the future
+
+        ret = CCode('')
+        ret += const_prefix
+        ret += typ.to_ccode()
+        ret += CC_SPACE
+        ret += name.to_ccode()
+        ret += CC_ASSIGN
+        ret += value.to_ccode()
+        ret += CC_SEMICOLON_NL
+        return ret
+
+# writes out the C code into `folder`, split into `units` translation units
+# returns the files of each unit, the `.c` file first followed by what it #includes
+def gen_c(program:Program, folder:str, units:int, pretty:bool) -> list[list[str]]:
+    if units == 1:
+        file_out = os.path.join(folder, FILE_OUTPUT)
+        file_pool = os.path.join(folder, FILE_OUTPUT_POOL)
+        with CodeGen(file_out, file_pool, pretty=pretty) as codegen:
+            codegen.gen_program(program)
+        return [[file_out, file_pool]]
+
+    ret = []
+    header = os.path.join(folder, FILE_OUTPUT_HEADER)
+
+    # needs to be split before the header is written, since that changes which fns are static
+    for idx, unit in enumerate(split_program(program, units)):
+        file_out = os.path.join(folder, f'code_{idx}.c')
+        file_pool = os.path.join(folder, f'code_pool_{idx}.h')
+        with CodeGen(file_out, file_pool, pretty=pretty, header=header) as codegen:
+            codegen.gen_program(unit)
+        ret.append([file_out, file_pool, header])
+
+    with CodeGen(header, None, pretty=pretty) as codegen:
+        codegen.gen_header(program)
+
+    return ret
@@ -1,6 +1,6 @@
 
 NEWLINE = '\n'
-WHITESPACE = [' ', '\t', NEWLINE]
+WHITESPACE = [' ', '\t', NEWLINE, '\r'] # `\r` so that CRLF sources work now that we read them as bytes
 
 FN_ARG_BEGIN = '['
 FN_ARG_END = ']'
@@ -33,9 +33,18 @@ STATEMENT_BEGINNINGS = [ST_BEG_RET, ST_BEG_VAL, ST_BEG_VAR, ST_BEG_INC, ST_BEG_D
 
 MT_FN_DEF = 'fn'
 MT_FN_DEC = 'fn@'
-METATYPES = [MT_FN_DEF, MT_FN_DEC]
+MT_IMPORT = 'import'
+METATYPES = [MT_FN_DEF, MT_FN_DEC, MT_IMPORT]
+
+MODULE_EXTENSION = '.yasl'
 
 MACRO_BODY_BEGIN = '('
 MACRO_BODY_END = ')'
 # right now those CAN be part of a variable name
 # I'm intentionally keeping this here, just to see what happens
+
+TK_NAME = 'name'
+TK_NUMBER = 'number'
+TK_STRING = 'string'
+TK_SEP = 'separator'
+TK_BLOCK = 'block' # `{` and `}`, they are not separators, but a word beginning with one of them gets split
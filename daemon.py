@@ -0,0 +1,397 @@
+#! /usr/bin/env python3
+
+# keeps the compiler running, so that a rebuild doesn't have to start python and parse everything all over again
+# the modules get watched for changes (by polling, since there's no inotify in the standard library) and parsed again
+# as soon as they change; the ones that didn't change (nor did the signatures they import) stay parsed in memory,
+# and so do the fn definitions (see `FnCache`), so that only the fns that changed get parsed again
+# the builds are requested over a unix socket, one json object per line each way, see `Daemon.build`
+# the output of each build (and of each parse) goes to a stream of its own, since they happen on different threads
+# usage: daemon.py serve [--poll SECONDS]
+#        daemon.py build [--profile PROFILE] [--units N] [--no-pretty] [--train-input FILE] [--run]
+
+from typing import TextIO
+from typing import Any
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import Future
+from concurrent.futures import wait
+from concurrent.futures import FIRST_COMPLETED
+import multiprocessing
+import socketserver
+import subprocess
+import contextlib
+import threading
+import signal
+import argparse
+import pickle
+import socket
+import time
+import json
+import sys
+import io
+import os
+
+from parser_types import *
+from constants import *
+from yasl import FOLDER_TMP
+from yasl import FILE_INPUT
+from yasl import FILE_EXECUTABLE
+from yasl import FOLDER_FN_CACHE
+from yasl import FN_CACHE_MAX_BYTES
+from yasl import FOLDER_GCC_CACHE
+from yasl import GCC_CACHE_MAX_BYTES
+from yasl import FOLDER_PGO
+from yasl import TRANSLATION_UNITS
+from yasl import PRETTY_C
+from yasl import MODULE_SEARCH_PATH
+from yasl import MAX_ERRORS
+from yasl import EXPORTS
+from yasl import INLINE_THRESHOLD
+from yasl import scan_imports
+from yasl import parse_module
+from codegen import gen_c
+from optimize import fold_constants
+from optimize import drop_unreachable_functions
+from optimize import set_linkage
+from modules import merge_modules
+from modules import sort_modules
+from fn_cache import FnCache
+from artifact_cache import ArtifactCache
+from build import Builder
+from build import BUILD_PROFILES
+from build import DEFAULT_BUILD_PROFILE
+
+FILE_SOCKET = os.path.join(FOLDER_TMP, 'daemon.sock')
+POLL_SECONDS = 0.2
+FN_CACHE_MEMORY_BYTES = 64 * 1024 * 1024
+
+# `parse_module`, but with the errors and warnings returned instead of printed,
+# since they can't be printed straight to the stream of the build from another process
+def parse_module_output(file_in:str, imported_functions:list[FnSignature], fn_cache:FnCache) -> tuple[Program, list[FnSignature], int, str]:
+    out = io.StringIO()
+    program, exports, _counters, errors = parse_module(file_in, imported_functions, fn_cache, MAX_ERRORS, out)
+    return program, exports, errors, out.getvalue()
+
+# None if the file is gone
+def file_stamp(path:str) -> None|tuple[int,int]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class ParsedModule:
+
+    __slots__ = ('stamp', 'imported_functions', 'key', 'fresh', 'snapshot', 'exports', 'errors', 'output')
+
+    # `stamp` - of the file, from right before it got parsed
+    # `key` - everything else the result depends on: the signatures of `imported_functions`
+    # `fresh` - the syntax tree, as long as none of the passes got to it
+    # `output` - the errors and warnings, to be shown again every time the module gets reused
+    def __init__(self, stamp:None|tuple[int,int], imported_functions:list[FnSignature], key:str, fresh:Program, exports:list[FnSignature], errors:int, output:str) -> None:
+        self.stamp = stamp
+        self.imported_functions = imported_functions
+        self.key = key
+        self.fresh:None|Program = fresh
+        self.snapshot:None|bytes = None # the syntax tree pickled, since the passes modify it; taken when there's nothing else to do, see `Daemon.take_snapshots`
+        self.exports = exports
+        self.errors = errors
+        self.output = output
+
+class Daemon:
+
+    def __init__(self, file_in:str) -> None:
+        self.file_in = os.path.realpath(file_in)
+
+        self.lock = threading.Lock() # one build (or parse) at a time
+        self.modules:dict[str,ParsedModule] = {} # module path -> the result of parsing it
+
+        os.makedirs(FOLDER_TMP, exist_ok=True)
+        self.fn_cache = FnCache(FOLDER_FN_CACHE, FN_CACHE_MAX_BYTES, FN_CACHE_MEMORY_BYTES)
+        self.gcc_cache = ArtifactCache(FOLDER_GCC_CACHE, GCC_CACHE_MAX_BYTES)
+
+        # for when more than one module needs parsing at the same time, like `parse_modules` does;
+        # kept around so that the processes only start once, and not forked since the daemon has threads
+        self.pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context('forkserver'))
+
+    # does what `pop_modules` does, but only parses the modules that changed since the last time
+    # returns None if there were errors; the errors and warnings of every module go to `out`, parsed again or not
+    def parse(self, out:TextIO) -> None|Program:
+        imports, errors = scan_imports(self.file_in, MODULE_SEARCH_PATH, MAX_ERRORS, out)
+        if errors > 0:
+            return None
+
+        order = sort_modules(self.file_in, imports, out)
+
+        done:set[str] = set()
+        running:dict[Future[tuple[Program,list[FnSignature],int,str]],tuple[str,ParsedModule]] = {}
+        while len(done) < len(order):
+            todo = self.modules_to_parse(order, imports, done, [path for path, _module in running.values()])
+
+            # the one that's left on its own is parsed right here, where `self.fn_cache` has the fns in memory
+            if len(todo) == 1 and len(running) == 0:
+                path, module = todo[0]
+                module.fresh, module.exports, module.errors, module.output = parse_module_output(path, module.imported_functions, self.fn_cache)
+                self.modules[path] = module
+                done.add(path)
+                continue
+
+            for path, module in todo:
+                running[self.pool.submit(parse_module_output, path, module.imported_functions, self.fn_cache)] = path, module
+
+            finished, _pending = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path, module = running.pop(future)
+                module.fresh, module.exports, module.errors, module.output = future.result()
+                self.modules[path] = module
+                done.add(path)
+
+        for path in order:
+            out.write(self.modules[path].output)
+            errors += self.modules[path].errors
+
+        for path in list(self.modules):
+            if path not in imports:
+                del self.modules[path] # not imported anymore
+
+        if errors > 0:
+            return None
+
+        return merge_modules([self.take_program(path) for path in order], order, out)
+
+    # the modules in `order` whose imports are `done` and that are not `running` yet; the ones that don't need to get
+    # parsed again get added to `done`, the rest get returned (with a `ParsedModule` to be filled in)
+    def modules_to_parse(self, order:list[str], imports:dict[str,list[str]], done:set[str], running:list[str]) -> list[tuple[str,ParsedModule]]:
+        ret:list[tuple[str,ParsedModule]] = []
+
+        for path in order:
+            if path in done or path in running or not all(dep in done for dep in imports[path]):
+                continue
+
+            imported_functions:dict[str,FnSignature] = {}
+            for dep in imports[path]:
+                for fn in self.modules[dep].exports:
+                    imported_functions.setdefault(fn.name.to_str(), fn)
+            key = repr(list(imported_functions.values()))
+            stamp = file_stamp(path)
+
+            module = self.modules.get(path)
+            if module is not None and module.stamp == stamp and module.key == key:
+                done.add(path) # which can make the ones after it ready as well, since `order` has the imports first
+                continue
+
+            ret.append((path, ParsedModule(stamp, list(imported_functions.values()), key, Program(), [], 0, '')))
+
+        return ret
+
+    # the syntax tree of the module, for the passes to do whatever they want with
+    def take_program(self, path:str) -> Program:
+        module = self.modules[path]
+
+        if module.fresh is not None:
+            fresh = module.fresh
+            module.fresh = None
+            return fresh
+
+        if module.snapshot is not None:
+            program:Program = pickle.loads(module.snapshot)
+            return program
+
+        return self.parse_again(path) # the snapshot didn't get taken in time
+
+    # the module didn't change, so this is mostly going to come out of `self.fn_cache`, and the output has already been shown
+    def parse_again(self, path:str) -> Program:
+        module = self.modules[path]
+        program, _exports, _errors, _output = parse_module_output(path, module.imported_functions, self.fn_cache)
+        return program
+
+    def take_snapshots(self) -> None:
+        for path, module in self.modules.items():
+            if module.snapshot is None and module.errors == 0:
+                module.snapshot = pickle.dumps(module.fresh if module.fresh is not None else self.parse_again(path))
+
+    # whether any of the modules changed since it was parsed
+    def changed(self) -> bool:
+        return any(file_stamp(path) != module.stamp for path, module in self.modules.items())
+
+    # parses the modules that change, as soon as they do, so that it's already done by the time the build gets requested
+    def watch(self, poll:float) -> None:
+        while True:
+            time.sleep(poll)
+            self.refresh()
+
+    # one poll of `watch`
+    def refresh(self) -> None:
+        with self.lock:
+            try:
+                if self.changed():
+                    with contextlib.suppress(SystemExit):
+                        self.parse(io.StringIO()) # the output gets shown with the build
+                    self.fn_cache.evict()
+                self.take_snapshots()
+            except Exception: # pylint: disable=broad-exception-caught
+                pass # like a module that's gone for a moment while an editor saves it; the next poll or build tries again, and the build reports it
+
+    # `request` can have:
+    #     `profile` - one of `BUILD_PROFILES`
+    #     `units` - see `TRANSLATION_UNITS`
+    #     `pretty` - see `PRETTY_C`
+    #     `train_input` - see `Builder.build`
+    # the response has:
+    #     `ok` - whether the executable got built
+    #     `output` - the errors, warnings and such
+    #     `executable` - the path of the executable, None if it didn't get built
+    #     `seconds` - how long it all took
+    def build(self, request:dict[str,Any]) -> dict[str,Any]:
+        start = time.perf_counter()
+        output = io.StringIO()
+
+        with self.lock:
+            try:
+                ok = self.build_locked(request, output)
+            except SystemExit: # already reported by whatever exited
+                ok = False
+            except subprocess.CalledProcessError as e:
+                print(f'ERROR: {e}', file=output) # the output of gcc itself goes to the daemon's stderr
+                ok = False
+            except Exception as e: # pylint: disable=broad-exception-caught
+                print(f'ERROR: {e}', file=output) # like a module that's gone missing; the client still gets a response
+                ok = False
+
+        return {
+            'ok': ok,
+            'output': output.getvalue(),
+            'executable': FILE_EXECUTABLE if ok else None,
+            'seconds': time.perf_counter() - start,
+        }
+
+    def build_locked(self, request:dict[str,Any], out:TextIO) -> bool:
+        profile = request.get('profile', DEFAULT_BUILD_PROFILE)
+        units = request.get('units', TRANSLATION_UNITS)
+        pretty = request.get('pretty', PRETTY_C)
+        if profile not in BUILD_PROFILES:
+            print(f'ERROR: unknown profile `{profile}`; valid profiles are {list(BUILD_PROFILES)}', file=out)
+            return False
+        if not isinstance(units, int) or units < 1:
+            print(f'ERROR: invalid number of units `{units}`', file=out)
+            return False
+        if not isinstance(pretty, bool):
+            print(f'ERROR: invalid `pretty` `{pretty}`, needs to be true or false', file=out)
+            return False
+
+        program = self.parse(out)
+        if program is None:
+            return False
+
+        fold_constants(program)
+        for item in drop_unreachable_functions(program, EXPORTS):
+            metatype = MT_FN_DEF if isinstance(item, FnDefinition) else MT_FN_DEC
+            print(f'INFO: dropped unreachable `{metatype} {item.signature.name.to_str()}`', file=out)
+        set_linkage(program, EXPORTS, INLINE_THRESHOLD)
+
+        sources = gen_c(program, FOLDER_TMP, units, pretty)
+        Builder(self.gcc_cache, FILE_EXECUTABLE, FOLDER_PGO, out).build(profile, sources, request.get('train_input'))
+        return True
+
+class Server(socketserver.ThreadingUnixStreamServer):
+
+    daemon_threads = True # so that a client that never disconnects doesn't keep the daemon from exiting
+
+    def __init__(self, path:str, compiler:Daemon) -> None:
+        self.compiler = compiler
+        super().__init__(path, RequestHandler)
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self) -> None:
+        assert isinstance(self.server, Server)
+
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response:dict[str,Any] = {'ok': False, 'output': f'ERROR: invalid request: {e}\n', 'executable': None, 'seconds': 0.0}
+            else:
+                response = self.server.compiler.build(request)
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+
+def serve(args:argparse.Namespace) -> None:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        if sock.connect_ex(args.socket) == 0:
+            print(f'ERROR: a daemon is already listening on `{args.socket}`', file=sys.stderr)
+            sys.exit(1)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(args.socket) # left behind by a daemon that didn't exit cleanly
+
+    compiler = Daemon(FILE_INPUT)
+    with compiler.lock, contextlib.suppress(SystemExit):
+        compiler.parse(sys.stderr) # so that the first build is fast as well
+
+    threading.Thread(target=compiler.watch, args=(args.poll,), daemon=True).start()
+    signal.signal(signal.SIGTERM, lambda _signum, _frame: sys.exit(0)) # so that the socket gets removed
+
+    with Server(args.socket, compiler) as server:
+        print(f'INFO: listening on `{args.socket}`', file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(args.socket)
+
+def request_build(args:argparse.Namespace) -> None:
+    request = {
+        'profile': args.profile,
+        'units': args.units,
+        'pretty': args.pretty,
+        'train_input': None if args.train_input is None else os.path.realpath(args.train_input),
+    }
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(args.socket)
+        except OSError as e:
+            print(f'ERROR: could not connect to the daemon on `{args.socket}`: {e}; start it with `daemon.py serve`', file=sys.stderr)
+            sys.exit(1)
+
+        sock.sendall(json.dumps(request).encode() + b'\n')
+        with sock.makefile('rb') as f:
+            line = f.readline()
+
+    if len(line) == 0:
+        print(f'ERROR: the daemon on `{args.socket}` closed the connection without responding; see its output', file=sys.stderr)
+        sys.exit(1)
+    response = json.loads(line)
+
+    sys.stderr.write(response['output'])
+    print(f'INFO: built in {response["seconds"]:.3f}s', file=sys.stderr)
+
+    if not response['ok']:
+        sys.exit(1)
+
+    if args.run:
+        sys.exit(subprocess.run([response['executable']], check=False).returncode)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=f'keeps compiling `{os.path.basename(FILE_INPUT)}` in the background')
+    parser.add_argument('--socket', default=FILE_SOCKET, help=f'default: {FILE_SOCKET}')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='start the daemon')
+    serve_parser.add_argument('--poll', type=float, default=POLL_SECONDS, help=f'seconds in between checking the modules for changes; default: {POLL_SECONDS}')
+
+    build_parser = commands.add_parser('build', help='ask the daemon for a build')
+    build_parser.add_argument('--profile', choices=BUILD_PROFILES, default=DEFAULT_BUILD_PROFILE, help=f'default: {DEFAULT_BUILD_PROFILE}')
+    build_parser.add_argument('--units', type=int, default=TRANSLATION_UNITS, help=f'default: {TRANSLATION_UNITS}')
+    build_parser.add_argument('--no-pretty', dest='pretty', action='store_false', default=PRETTY_C, help='don\'t indent the generated C')
+    build_parser.add_argument('--train-input', help='file to feed to the training run of the `pgo` profile')
+    build_parser.add_argument('--run', action='store_true', help='run the executable once built')
+
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args)
+    else:
+        request_build(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+from typing import NoReturn
+from typing import TextIO
+import sys
+
+# the errors and warnings of a file; they get printed as soon as they're found, and the parser keeps going after an error
+# (see `Src.pop_code_block_nohead` and `Src.pop_program`), so that a single run shows everything that's wrong
+
+# raised after the error has been reported, for the parser to skip to somewhere it can pick up again from
+class ParseError(Exception):
+    pass
+
+# raised instead of `ParseError` once `max_errors` is reached; the rest of the file doesn't get parsed
+class ErrorLimitReached(Exception):
+    pass
+
+class Diagnostics:
+
+    # `max_errors` - None for no limit
+    # `out` - where to print them, None for stderr
+    def __init__(self, file_in:str, max_errors:None|int, out:None|TextIO=None) -> None:
+        self.file_in = file_in
+        self.max_errors = max_errors
+        self.out = sys.stderr if out is None else out
+
+        self.errors:list[tuple[int,int,str]] = [] # line, column, msg
+        self.warnings:list[tuple[int,int,str]] = [] # line, column, msg
+
+    def warn(self, msg:str, line:int, column:int) -> None:
+        self.warnings.append((line, column, msg))
+        print(f'WARNING: file `{self.file_in}`: line {line}: column {column}: {msg}', file=self.out)
+
+    def err(self, msg:str, line:int, column:int) -> NoReturn:
+        self.errors.append((line, column, msg))
+        print(f'ERROR: file `{self.file_in}`: line {line}: column {column}: {msg}', file=self.out)
+
+        if self.max_errors is not None and len(self.errors) >= self.max_errors:
+            print(f'ERROR: file `{self.file_in}`: stopping after {len(self.errors)} errors', file=self.out)
+            raise ErrorLimitReached()
+
+        raise ParseError(msg)
+
+# for when `errors` errors have already been reported
+def exit_with_errors(errors:int) -> NoReturn:
+    print(f'ERROR: {errors} error{"s" if errors > 1 else ""}, nothing got compiled', file=sys.stderr)
+    sys.exit(1)
@@ -0,0 +1,65 @@
+import os
+
+from artifact_cache import FOLDER_INCOMPLETE
+from artifact_cache import evict
+
+# where `Src` keeps the parsed fn definitions (pickled), see `Src.popif_cached_fn_definition`
+# on disk, and optionally in memory as well, for when the same process parses things over and over (see `daemon.py`)
+# the least recently used ones get evicted from the disk once it grows past `max_bytes`; that happens when the cache
+# gets created (so once per run) and whenever `evict` gets called, rather than on every `put`, since there are a lot of them
+
+class FnCache:
+
+    # `memory_max_bytes` - how much to keep in memory, 0 to always go to the disk; once full, the memory gets cleared
+    def __init__(self, folder:str, max_bytes:int, memory_max_bytes:int=0) -> None:
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.memory_max_bytes = memory_max_bytes
+
+        self.memory:dict[str,bytes] = {}
+        self.memory_bytes = 0
+
+        os.makedirs(os.path.join(self.folder, FOLDER_INCOMPLETE), exist_ok=True)
+        self.evict()
+
+    # returns None if there's no entry
+    def get(self, key:str) -> None|bytes:
+        data = self.memory.get(key)
+        if data is not None:
+            return data
+
+        try:
+            with open(os.path.join(self.folder, key), 'rb') as f:
+                os.utime(f.fileno()) # the mtime is what the eviction goes by
+                data = f.read()
+        except OSError:
+            return None
+
+        self.remember(key, data)
+        return data
+
+    def put(self, key:str, data:bytes) -> None:
+        # written to a temporary file first, since the modules are parsed by multiple processes at the same time
+        path = os.path.join(self.folder, key)
+        path_tmp = os.path.join(self.folder, FOLDER_INCOMPLETE, f'{key}.{os.getpid()}')
+        with open(path_tmp, 'wb') as f:
+            f.write(data)
+        os.replace(path_tmp, path)
+
+        self.remember(key, data)
+
+    def remember(self, key:str, data:bytes) -> None:
+        if len(data) > self.memory_max_bytes:
+            return
+        if self.memory_bytes + len(data) > self.memory_max_bytes:
+            self.memory.clear()
+            self.memory_bytes = 0
+        self.memory[key] = data
+        self.memory_bytes += len(data)
+
+    # the processes it gets sent to (see `parse_modules`) get it without the memory, which is only of use to this process
+    def __getstate__(self) -> dict[str,object]:
+        return {**self.__dict__, 'memory': {}, 'memory_bytes': 0}
+
+    def evict(self) -> None:
+        evict(self.folder, self.max_bytes)
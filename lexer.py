@@ -0,0 +1,324 @@
+from typing import Callable
+from typing import NoReturn
+import collections
+import bisect
+import array
+import mmap
+import re
+import os
+
+from constants import *
+from diagnostics import ParseError
+import stats
+
+# the source is read as bytes, either straight out of a memory-mapped file or out of a `bytes` object,
+# so that it never has to be decoded (or even be in memory) as a whole; only the tokens get decoded
+Buffer = bytes | mmap.mmap
+
+def map_file(file_in:str) -> Buffer:
+    with open(file_in, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b'' # can't mmap an empty file
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+######
+###### token
+######
+
+class Token:
+
+    __slots__ = ('kind', 'text', 'begin', 'end')
+
+    def __init__(self, kind:str, text:str, begin:int, end:int) -> None:
+        self.kind = kind
+        self.text = text
+        self.begin = begin
+        self.end = end
+
+######
+###### lexer
+######
+
+B_NEWLINE = NEWLINE.encode()
+B_STRING = ord(STRING)
+B_WHITESPACE = frozenset(ord(ch) for ch in WHITESPACE)
+B_SEPARATORS = frozenset(ord(ch) for ch in SEPARATORS)
+B_BLOCKS = frozenset([ord(CODE_BLOCK_BEGIN), ord(CODE_BLOCK_END)])
+
+RE_WHITESPACE = re.compile(b'(?:[' + re.escape(''.join(WHITESPACE).encode()) + b']+|//[^' + re.escape(B_NEWLINE) + b']*)*')
+RE_NAME = re.compile(b'[^' + re.escape(''.join(SEPARATORS).encode()) + b']+')
+RE_NUMBER = re.compile(rb'[+-]?(?:0[xX][0-9a-fA-F]+|(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][+-]?[0-9]+)?)')
+B_NUMBER_BEGINNINGS = frozenset(b'+-.0123456789')
+
+# everything up to the next token that is a `{` or `}` (or an unterminated string), in one go; see `pop_block`
+# the alternatives are the same as in `lex`, except that a name can't begin with a `{` or `}`
+RE_SKIP_TO_BLOCK = re.compile(
+    b'(?:[' + re.escape(''.join(WHITESPACE).encode()) + b']+' +
+    b'|//[^' + re.escape(B_NEWLINE) + b']*' +
+    b'|' + re.escape(STRING.encode()) + b'[^' + re.escape(STRING.encode()) + b']*' + re.escape(STRING.encode()) +
+    b'|[' + re.escape(''.join(ch for ch in SEPARATORS if ch != STRING).encode()) + b']' +
+    b'|[^' + re.escape(''.join(SEPARATORS + [CODE_BLOCK_BEGIN, CODE_BLOCK_END]).encode()) + b'][^' + re.escape(''.join(SEPARATORS).encode()) + b']*' +
+    b')*'
+)
+B_CODE_BLOCK_BEGIN = ord(CODE_BLOCK_BEGIN)
+B_CODE_BLOCK_END = ord(CODE_BLOCK_END)
+
+# the source gets lexed exactly once, tokens that have been peeked at are kept in `self.lookahead` until popped
+class Lexer:
+
+    def __init__(self, src:Buffer, err:Callable[[str],NoReturn]) -> None:
+        self.src = src
+        self.src_len = len(src)
+        self.idx = 0
+        self.err = err
+
+        self.lookahead:collections.deque[Token] = collections.deque()
+        self.last_end = 0 # end of the last popped token
+
+        # for `stats.counters`
+        self.tokens_lexed = 0
+        self.peeks = 0
+        self.closed = False
+
+        # filled in lazily, only as far as a diagnostic needs it, so that we don't pay for it on huge inputs
+        self.newline_offsets = array.array('q')
+        self.newline_scanned = 0
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+
+        stats.counters[stats.CNT_CHARS_LEXED] += self.idx
+        stats.counters[stats.CNT_TOKENS_LEXED] += self.tokens_lexed
+        stats.counters[stats.CNT_PEEKS] += self.peeks
+
+        self.lookahead.clear()
+        if isinstance(self.src, mmap.mmap):
+            self.src.close()
+
+    def line_number(self) -> int:
+        while self.newline_scanned < self.last_end:
+            idx = self.src.find(B_NEWLINE, self.newline_scanned)
+            if idx == -1:
+                self.newline_scanned = self.src_len
+                break
+            self.newline_offsets.append(idx)
+            self.newline_scanned = idx + 1
+
+        return bisect.bisect_left(self.newline_offsets, self.last_end) + 1
+
+    # line and column, both starting at 1
+    def position(self) -> tuple[int,int]:
+        line = self.line_number()
+        line_begin = self.newline_offsets[line - 2] + 1 if line > 1 else 0
+        return line, self.last_end - line_begin + 1
+
+    def decode(self, begin:int, end:int) -> str:
+        try:
+            text = self.src[begin:end].decode()
+        except UnicodeDecodeError as e:
+            self.last_end = begin
+            self.err(f'invalid utf-8: {e.reason}')
+        return text
+
+    # lex
+
+    def skip_whitespace(self) -> None:
+        match = RE_WHITESPACE.match(self.src, self.idx)
+        assert match is not None # the regex can match an empty string
+        self.idx = match.end()
+
+    def lex(self) -> None|Token:
+        self.skip_whitespace()
+
+        begin = self.idx
+
+        if begin >= self.src_len:
+            return None
+
+        ch = self.src[begin]
+
+        if ch == B_STRING:
+            end = self.src.find(bytes([B_STRING]), begin + 1)
+            if end == -1:
+                self.idx = self.src_len # so that whoever recovers from the error doesn't run into it again
+                self.last_end = begin
+                self.err(f'could not find string end `{STRING}`')
+            end += 1
+            kind = TK_STRING
+
+        elif ch in B_SEPARATORS:
+            end = begin + 1
+            kind = TK_SEP
+
+        elif ch in B_BLOCKS:
+            end = begin + 1
+            kind = TK_BLOCK
+
+        else:
+            match = RE_NAME.match(self.src, begin)
+            assert match is not None
+            end = match.end()
+            kind = TK_NAME
+
+            if ch in B_NUMBER_BEGINNINGS and RE_NUMBER.fullmatch(self.src, begin, end):
+                kind = TK_NUMBER
+
+        self.idx = end
+        self.tokens_lexed += 1
+        return Token(kind, self.decode(begin, end), begin, end)
+
+    # lookahead
+
+    def peek(self, k:int=0) -> None|Token:
+        self.peeks += 1
+        while len(self.lookahead) <= k:
+            tok = self.lex()
+            if tok is None:
+                return None
+            self.lookahead.append(tok)
+        return self.lookahead[k]
+
+    def peek_str(self, k:int=0) -> str:
+        tok = self.peek(k)
+        if tok is None:
+            return '<end of file>'
+        return tok.text
+
+    def pop(self) -> Token:
+        tok = self.peek()
+        assert tok is not None
+        self.lookahead.popleft()
+        self.last_end = tok.end
+        return tok
+
+    def popif(self, text:str) -> bool:
+        tok = self.peek()
+        if tok is None or tok.text != text:
+            return False
+        self.pop()
+        return True
+
+    # pops everything up to and including the `}` matching the `{` that comes next
+    # returns the offsets of the whole block, or None if it never gets closed (in which case the position is undefined, see `seek`)
+    # doesn't make tokens out of what's in between, since it's there to skip over the fn bodies that are in `FnCache`
+    def pop_block(self) -> None|tuple[int,int]:
+        first = self.peek()
+        assert first is not None and first.text == CODE_BLOCK_BEGIN
+
+        self.lookahead.clear()
+        idx = first.end
+        depth = 1
+        while True:
+            match = RE_SKIP_TO_BLOCK.match(self.src, idx)
+            assert match is not None # the regex can match an empty string
+            idx = match.end()
+            if idx >= self.src_len:
+                return None
+
+            ch = self.src[idx]
+            idx += 1
+            if ch == B_CODE_BLOCK_BEGIN:
+                depth += 1
+            elif ch == B_CODE_BLOCK_END:
+                depth -= 1
+                if depth == 0:
+                    self.idx = idx
+                    self.last_end = idx
+                    return first.begin, idx
+            else:
+                return None # a string that never ends, let the regular lexing complain about it
+
+    # error recovery: pops everything up to the next line (the lines of the nested blocks don't count),
+    # or up to the `}` that closes the current block, or up to one of `stop_at`, whichever comes first
+    # `force` - pop at least one token, for when nothing has been popped since the last time this was called
+    # returns the token it stopped in front of, None if it reached the end of file
+    def skip_line(self, force:bool, stop_at:list[str]) -> None|Token:
+        line_end = self.line_end()
+        depth = 0
+        while True:
+            try:
+                tok = self.peek()
+            except ParseError:
+                continue # already reported, and the lexer has moved past it
+            if tok is None:
+                return None
+
+            if tok.kind == TK_NAME and tok.text in stop_at:
+                return tok
+            if not force and depth == 0 and (tok.text == CODE_BLOCK_END or tok.begin > line_end):
+                return tok
+
+            if tok.kind == TK_BLOCK:
+                depth += 1 if tok.text == CODE_BLOCK_BEGIN else -1
+                depth = max(depth, 0)
+            self.pop()
+
+            if force:
+                force = False
+                line_end = self.line_end()
+
+    # error recovery: pops everything up to (not including) the next one of `names`
+    def skip_until(self, names:list[str]) -> None:
+        while True:
+            try:
+                tok = self.peek()
+            except ParseError:
+                continue
+            if tok is None or (tok.kind == TK_NAME and tok.text in names):
+                return
+            self.pop()
+
+    # offset of the end of the line that the last popped token is on
+    def line_end(self) -> int:
+        idx = self.src.find(B_NEWLINE, self.last_end)
+        if idx == -1:
+            return self.src_len
+        return idx
+
+    # continue from `idx`, as if nothing after it had been popped
+    def seek(self, idx:int) -> None:
+        self.lookahead.clear()
+        self.idx = idx
+        self.last_end = idx
+
+    # raw access, for the few places where the source is not made of tokens
+
+    # forget about the lookahead, so that the next read starts right after the last popped token
+    def rewind(self) -> None:
+        if len(self.lookahead) > 0:
+            self.idx = self.lookahead[0].begin
+            self.lookahead.clear()
+
+    # does not skip the whitespace before, but consumes the one after
+    def pop_raw_until_whitespace(self) -> str:
+        self.rewind()
+
+        begin = self.idx
+        end = begin
+        while end < self.src_len and self.src[end] not in B_WHITESPACE:
+            end += 1
+
+        self.idx = min(end + 1, self.src_len)
+        self.last_end = self.idx
+        return self.decode(begin, end)
+
+    # returns what's in between `begin` and `end`
+    def popif_raw_enclosed(self, begin:str, end:str) -> None|str:
+        self.rewind()
+        self.skip_whitespace()
+
+        b_begin = begin.encode()
+        if self.src[self.idx:self.idx+len(b_begin)] != b_begin:
+            return None
+
+        content_begin = self.idx + len(b_begin)
+        content_end = self.src.find(end.encode(), content_begin)
+        if content_end == -1:
+            self.idx = self.src_len
+            self.err(f'could not find closing `{end}`')
+
+        self.idx = content_end + len(end.encode())
+        self.last_end = self.idx
+        return self.decode(content_begin, content_end)
@@ -0,0 +1,149 @@
+# calls yasl fns from python, in the same process: the program gets built into a shared library
+# that gets loaded with ctypes, and the args and return values get converted according to the fns' signatures
+# usage:
+#     lib = library.load('kernels.yasl', ['add-int'])
+#     add_int = lib['add-int'] # worth keeping around, when calling it a lot
+#     add_int(6, 8)
+
+from typing import Any
+import subprocess
+import tempfile
+import hashlib
+import ctypes
+import shutil
+import os
+
+from parser_types import *
+from yasl import FOLDER_TMP
+from yasl import FILE_LIBRARY
+from yasl import FOLDER_FN_CACHE
+from yasl import FN_CACHE_MAX_BYTES
+from yasl import FOLDER_GCC_CACHE
+from yasl import GCC_CACHE_MAX_BYTES
+from yasl import MODULE_SEARCH_PATH
+from yasl import INLINE_THRESHOLD
+from yasl import PRETTY_C
+from yasl import pop_modules
+from codegen import gen_c
+from optimize import fold_constants
+from optimize import drop_unreachable_functions
+from optimize import set_linkage
+from modules import check_exports
+from fn_cache import FnCache
+from artifact_cache import ArtifactCache
+from artifact_cache import FOLDER_INCOMPLETE
+from artifact_cache import evict
+from build import Builder
+from build import BUILD_PROFILES
+
+FOLDER_LIBRARIES = os.path.join(FOLDER_TMP, 'libraries') # every build gets its own file, since the loaded ones can't be replaced
+LIBRARIES_MAX_BYTES = 64 * 1024 * 1024 # the least recently loaded ones get evicted past this; it's fine for them to still be loaded
+
+DEFAULT_PROFILE = 'release' # the fns are going to be called a lot
+
+# yasl type -> ctypes type, see `to_ctype` for the pointers
+CTYPES:dict[str,Any] = {
+    'void': None,
+    'char': ctypes.c_char,
+    'short': ctypes.c_short,
+    'int': ctypes.c_int,
+    'long': ctypes.c_long,
+    'unsigned': ctypes.c_uint,
+    'float': ctypes.c_float,
+    'double': ctypes.c_double,
+    'size_t': ctypes.c_size_t,
+    'int8_t': ctypes.c_int8,
+    'int16_t': ctypes.c_int16,
+    'int32_t': ctypes.c_int32,
+    'int64_t': ctypes.c_int64,
+    'uint8_t': ctypes.c_uint8,
+    'uint16_t': ctypes.c_uint16,
+    'uint32_t': ctypes.c_uint32,
+    'uint64_t': ctypes.c_uint64,
+    'char*': ctypes.c_char_p, # python `bytes`
+    'void*': ctypes.c_void_p,
+}
+
+class LibraryError(Exception):
+    pass
+
+def to_ctype(typ:Type) -> Any:
+    name = typ.to_str()
+
+    if name in CTYPES:
+        return CTYPES[name]
+
+    if name.endswith('*'):
+        return ctypes.POINTER(to_ctype(Type(name[:-1])))
+
+    raise LibraryError(f'type `{name}` can\'t be passed to or from python; supported types are {list(CTYPES)} and pointers to them')
+
+class Library:
+
+    # `signatures` - of the fns to make callable
+    def __init__(self, path:str, signatures:list[FnSignature]) -> None:
+        self.dll = ctypes.CDLL(path)
+
+        self.fns:dict[str,Any] = {} # fn name -> ctypes fn
+        for sig in signatures:
+            assert isinstance(sig.args, FnDeclArgs) # only `fn`s get exported, and they always have these
+
+            fn = self.dll[sig.name.to_mangled()]
+            fn.argtypes = [to_ctype(typ) for _name, typ in sig.args.generator()]
+            fn.restype = to_ctype(sig.get_ret_type())
+            self.fns[sig.name.to_str()] = fn
+
+    def __getitem__(self, name:str) -> Any:
+        fn = self.fns.get(name)
+        if fn is None:
+            raise KeyError(f'`{name}` is not one of the exported fns {list(self.fns)}')
+        return fn
+
+    def __contains__(self, name:str) -> bool:
+        return name in self.fns
+
+# builds `file_in` (and everything it imports) into a shared library, and loads it
+# `exports` - the fns to make callable, the rest is free to get inlined or dropped
+# `profile` - any of `BUILD_PROFILES` but `pgo`
+# raises `LibraryError` if it doesn't compile, the errors themselves get printed to stderr as usual (gcc's included)
+def load(file_in:str, exports:list[str], profile:str=DEFAULT_PROFILE) -> Library:
+    if profile not in BUILD_PROFILES or profile == 'pgo':
+        raise LibraryError(f'profile `{profile}` can\'t be used for a shared library')
+
+    os.makedirs(os.path.join(FOLDER_LIBRARIES, FOLDER_INCOMPLETE), exist_ok=True)
+
+    try:
+        program = pop_modules(file_in, MODULE_SEARCH_PATH, FnCache(FOLDER_FN_CACHE, FN_CACHE_MAX_BYTES))
+        check_exports(program, exports)
+    except SystemExit as e:
+        raise LibraryError(f'could not compile `{file_in}`') from e
+
+    defined = {item.signature.name.to_str(): item.signature for item in program.items if isinstance(item, FnDefinition)}
+
+    fold_constants(program)
+    drop_unreachable_functions(program, exports)
+    set_linkage(program, exports, INLINE_THRESHOLD)
+
+    # not in `FOLDER_TMP`, where another `load`, the daemon or the command line could be writing the C at the same time
+    with tempfile.TemporaryDirectory() as folder:
+        sources = gen_c(program, folder, 1, PRETTY_C)
+        library = os.path.join(folder, os.path.basename(FILE_LIBRARY))
+
+        builder = Builder(ArtifactCache(FOLDER_GCC_CACHE, GCC_CACHE_MAX_BYTES), os.path.join(folder, 'executable'), os.path.join(folder, 'pgo'))
+        try:
+            builder.build_shared(profile, sources, library)
+        except subprocess.CalledProcessError as e:
+            raise LibraryError('gcc failed') from e
+
+        with open(library, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        path = os.path.join(FOLDER_LIBRARIES, f'{digest}.so')
+        try:
+            os.utime(path) # the mtime is what the eviction goes by
+        except FileNotFoundError:
+            evict(FOLDER_LIBRARIES, LIBRARIES_MAX_BYTES) # before the copy, so that the new one doesn't get evicted
+            path_tmp = os.path.join(FOLDER_LIBRARIES, FOLDER_INCOMPLETE, f'{digest}.{os.getpid()}')
+            shutil.copy2(library, path_tmp)
+            os.replace(path_tmp, path) # so that another process can't load it half copied
+
+    return Library(path, [defined[name] for name in exports])
@@ -0,0 +1,64 @@
+from typing import TextIO
+import sys
+
+from parser_types import *
+
+# the parts of putting the modules together that don't need the parser, see `pop_modules` in `yasl.py`
+
+# `modules` and their `paths` in the order they should end up in the C file
+# `out` - where the errors go, None for stderr (same for `sort_modules`)
+def merge_modules(modules:list[Program], paths:list[str], out:None|TextIO=None) -> Program:
+    program = Program()
+    defined_in:dict[str,str] = {} # fn name -> module path
+    declared:dict[str,tuple[FnSignature,str]] = {} # fn name -> the `fn@` that's kept, and its module path
+
+    for module, path in zip(modules, paths, strict=True):
+        for item in module.items:
+            name = item.signature.name.to_str()
+            match item:
+                case FnDefinition():
+                    if name in defined_in:
+                        print(f'ERROR: function `{name}` defined in both `{defined_in[name]}` and `{path}`', file=sys.stderr if out is None else out)
+                        sys.exit(1)
+                    defined_in[name] = path
+                case FnDeclaration():
+                    if name in declared:
+                        kept, kept_path = declared[name]
+                        ok, reason = kept.matches(item.signature)
+                        if not ok:
+                            print(f'ERROR: function `{name}` declared differently in `{kept_path}` and `{path}`: {reason}', file=sys.stderr if out is None else out)
+                            sys.exit(1)
+                        continue # the C only gets the one prototype
+                    declared[name] = item.signature, path
+            program.add_another(item)
+
+    return program
+
+# exits if any of the `exports` is not a `fn` defined in `program`, rather than leaving it to be silently dropped
+def check_exports(program:Program, exports:list[str], out:None|TextIO=None) -> None:
+    defined = {item.signature.name.to_str() for item in program.items if isinstance(item, FnDefinition)}
+    missing = [name for name in exports if name not in defined]
+    if len(missing) > 0:
+        print(f'ERROR: can\'t export {missing}, since there are no such `fn`s', file=sys.stderr if out is None else out)
+        sys.exit(1)
+
+# returns the modules in the order in which they can be parsed (the root one being last)
+def sort_modules(root:str, imports:dict[str,list[str]], out:None|TextIO=None) -> list[str]:
+    order:list[str] = []
+    visiting:list[str] = []
+
+    def visit(path:str) -> None:
+        if path in order:
+            return
+        if path in visiting:
+            cycle = visiting[visiting.index(path):] + [path]
+            print(f'ERROR: import cycle: {" -> ".join(cycle)}', file=sys.stderr if out is None else out)
+            sys.exit(1)
+        visiting.append(path)
+        for dep in imports[path]:
+            visit(dep)
+        visiting.pop()
+        order.append(path)
+
+    visit(root)
+    return order
@@ -0,0 +1,479 @@
+import zlib
+
+from parser_types import *
+
+# passes that run over the syntax tree, in between parsing and codegen
+
+COMPTIME_STEP_BUDGET = 100_000 # statements executed per compile-time call, before giving up
+COMPTIME_MAX_DEPTH = 200 # nested compile-time calls, before giving up
+
+FN_ENTRY_POINT = 'main'
+
+######
+###### compile-time evaluation
+######
+
+class ComptimeGiveUp(Exception):
+    pass
+
+# evaluates calls to "pure" yasl functions with constant arguments at compile time
+# pure meaning: integer args and return type, and only `val`/`var`/`inc`/`dec`/`ret`/scopes over
+# the args, literals and calls to other pure functions
+class ComptimeEvaluator:
+
+    def __init__(self, program:Program, step_budget:int=COMPTIME_STEP_BUDGET) -> None:
+        defined:dict[str,FnDefinition] = {}
+        for item in program.items:
+            match item:
+                case FnDefinition():
+                    defined[item.signature.name.to_str()] = item
+                case FnDeclaration():
+                    pass
+
+        self.pure = find_pure_functions(defined)
+        self.step_budget = step_budget
+        self.steps_left = 0
+        self.depth = 0
+        self.memo:dict[tuple[str,tuple[int,...]],None|int] = {} # (fn name, args) -> result
+
+    def is_pure(self, fn_name:FnName) -> bool:
+        return fn_name.to_str() in self.pure
+
+    # returns None if the call can't be evaluated
+    def call(self, fn_name:FnName, args:tuple[int,...]) -> None|int:
+        key = (fn_name.to_str(), args)
+        if key in self.memo:
+            return self.memo[key]
+
+        self.steps_left = self.step_budget
+        self.depth = 0
+        try:
+            result:None|int = self.call_nested(fn_name.to_str(), args)
+        except ComptimeGiveUp:
+            result = None
+
+        self.memo[key] = result
+        return result
+
+    def call_nested(self, name:str, args:tuple[int,...]) -> int:
+        key = (name, args)
+        memoized = self.memo.get(key)
+        if memoized is not None:
+            return memoized
+
+        fn = self.pure.get(name)
+        if fn is None:
+            raise ComptimeGiveUp()
+
+        self.depth += 1
+        if self.depth > COMPTIME_MAX_DEPTH:
+            raise ComptimeGiveUp()
+
+        env:dict[str,tuple[int,Type]] = {} # var name -> value, type
+        for (arg_name, arg_type), arg in zip(fn.args.args, args, strict=True):
+            env[arg_name.to_str()] = wrap_int(arg, arg_type), arg_type
+
+        result = self.exec_block(fn.body, env)
+        if result is None:
+            raise ComptimeGiveUp() # fell off the end of the function
+
+        self.depth -= 1
+
+        result = wrap_int(result, fn.signature.return_type)
+        self.memo[key] = result
+        return result
+
+    # returns the value of `ret`, or None if there wasn't one
+    def exec_block(self, block:CodeBlock, env:dict[str,tuple[int,Type]]) -> None|int:
+        for statement in block.statements:
+
+            self.steps_left -= 1
+            if self.steps_left < 0:
+                raise ComptimeGiveUp()
+
+            match statement:
+                case StVar():
+                    env[statement.name.to_str()] = wrap_int(self.eval(statement.value, env), statement.typ), statement.typ
+                case StIncDec():
+                    value, typ = env[statement.name.to_str()]
+                    delta = self.eval(statement.value, env)
+                    env[statement.name.to_str()] = wrap_int(value + delta if statement.inc else value - delta, typ), typ
+                case StRet():
+                    return self.eval(statement.value, env)
+                case StScope():
+                    ret = self.exec_block(statement.body, env)
+                    if ret is not None:
+                        return ret
+                case _:
+                    raise ComptimeGiveUp()
+
+        return None
+
+    def eval(self, value:Value, env:dict[str,tuple[int,Type]]) -> int:
+        match value.value:
+            case Num():
+                if not isinstance(value.value.value, int):
+                    raise ComptimeGiveUp()
+                return value.value.value
+            case Var():
+                var = env.get(value.value.name_or_value)
+                if var is None:
+                    raise ComptimeGiveUp()
+                return var[0]
+            case FnCall():
+                args = tuple(self.eval(arg, env) for arg in value.value.args.value)
+                return self.call_nested(value.value.name.to_str(), args)
+
+def find_pure_functions(defined:dict[str,FnDefinition]) -> dict[str,FnDefinition]:
+    callees:dict[str,set[str]] = {}
+    for name, fn in defined.items():
+        fn_callees:set[str] = set()
+        if is_pure_signature(fn) and is_pure_block(fn.body, fn_callees):
+            callees[name] = fn_callees
+
+    # a function is only pure if everything it calls is
+    changed = True
+    while changed:
+        changed = False
+        for name in list(callees):
+            if not callees[name].issubset(callees.keys()):
+                del callees[name]
+                changed = True
+
+    return {name: defined[name] for name in callees}
+
+def is_pure_signature(fn:FnDefinition) -> bool:
+    if fn.signature.can_ret_err: # the caller is supposed to check the error
+        return False
+    if fn.signature.return_type.to_str() not in COMPTIME_INT_TYPES:
+        return False
+    return all(typ.to_str() in COMPTIME_INT_TYPES for _name, typ in fn.args.args)
+
+def is_pure_block(block:CodeBlock, callees:set[str]) -> bool:
+    for statement in block.statements:
+        match statement:
+            case StVar():
+                if statement.typ.to_str() not in COMPTIME_INT_TYPES or not is_pure_value(statement.value, callees):
+                    return False
+            case StIncDec() | StRet():
+                if not is_pure_value(statement.value, callees):
+                    return False
+            case StScope():
+                if not is_pure_block(statement.body, callees):
+                    return False
+            case _:
+                return False
+    return True
+
+def is_pure_value(value:Value, callees:set[str]) -> bool:
+    match value.value:
+        case Num():
+            return isinstance(value.value.value, int)
+        case Var():
+            return True
+        case FnCall():
+            callees.add(value.value.name.to_str())
+            return all(is_pure_value(arg, callees) for arg in value.value.args.value)
+
+######
+###### constant folding
+######
+
+# walks the statements of every function in order, keeping track of the value of the variables
+# of `COMPTIME_INT_TYPES` whenever it's known at compile time (initialized with a literal, `inc`/`dec`ed by one, ...),
+# and replaces reading them with a literal; calls to pure functions with literal args get evaluated
+# the variables that are no longer read after that get dropped altogether, along with their `inc`s and `dec`s
+
+def fold_constants(program:Program) -> None:
+    comptime = ComptimeEvaluator(program)
+
+    for item in program.items:
+        match item:
+            case FnDefinition():
+                fold_block(item.body, {}, comptime)
+                drop_unread_vars(item.body)
+            case FnDeclaration():
+                pass
+
+# `known` is var name -> current value
+def fold_block(block:CodeBlock, known:dict[str,Num], comptime:ComptimeEvaluator) -> None:
+    for statement in block.statements:
+        match statement:
+
+            case StRet():
+                fold_value(statement.value, known, comptime)
+
+            case StVar():
+                fold_value(statement.value, known, comptime)
+                set_known(known, statement.name, statement.typ, statement.value)
+
+            case StIncDec():
+                fold_value(statement.value, known, comptime)
+
+                name = statement.name.to_str()
+                var = known.get(name)
+                delta = statement.value.value
+                if var is None or not isinstance(delta, Num) or not isinstance(delta.value, int):
+                    known.pop(name, None)
+                    continue
+
+                assert isinstance(var.value, int)
+                new_value = var.value + delta.value if statement.inc else var.value - delta.value
+                known[name] = Num(wrap_int(new_value, var.typ), var.typ)
+
+            case StCast():
+                fold_value(statement.value, known, comptime)
+                known.pop(statement.name.to_str(), None)
+
+            case StIf():
+                fold_value(statement.cond, known, comptime)
+
+                # the body might not run, so whatever it changes is unknown afterwards
+                fold_block(statement.body, dict(known), comptime)
+                for name in assigned_vars(statement.body):
+                    known.pop(name, None)
+
+            case StScope():
+                fold_block(statement.body, known, comptime)
+
+            case StFnCall():
+                fold_values(statement.call.args, known, comptime)
+
+def fold_value(value:Value, known:dict[str,Num], comptime:ComptimeEvaluator) -> None:
+    match value.value:
+        case Var():
+            var = known.get(value.value.name_or_value)
+            if var is not None:
+                value.value = var
+        case FnCall():
+            call = value.value
+            fold_values(call.args, known, comptime)
+
+            if comptime.is_pure(call.name):
+                args = tuple(arg.value.value for arg in call.args.value if isinstance(arg.value, Num) and isinstance(arg.value.value, int))
+                if len(args) == len(call.args.value):
+                    result = comptime.call(call.name, args)
+                    if result is not None:
+                        value.value = Num(result, call.get_ret_type())
+        case Num():
+            pass
+
+def fold_values(values:ValueTuple, known:dict[str,Num], comptime:ComptimeEvaluator) -> None:
+    for value in values.value:
+        fold_value(value, known, comptime)
+
+def set_known(known:dict[str,Num], name:VarName, typ:Type, value:Value) -> None:
+    num = value.value
+    if typ.to_str() in COMPTIME_INT_TYPES and isinstance(num, Num) and isinstance(num.value, int):
+        known[name.to_str()] = Num(wrap_int(num.value, typ), typ)
+    else:
+        known.pop(name.to_str(), None)
+
+def assigned_vars(block:CodeBlock) -> set[str]:
+    ret = set()
+    for statement in block.statements:
+        match statement:
+            case StIncDec():
+                ret.add(statement.name.to_str())
+            case StIf() | StScope():
+                ret |= assigned_vars(statement.body)
+    return ret
+
+# dropping unread variables
+
+def drop_unread_vars(body:CodeBlock) -> None:
+    reads:set[str] = set()
+    droppable:dict[str,bool] = {} # var name -> can all of its statements be dropped without losing a side effect
+    collect_var_usage(body, reads, droppable)
+
+    unread = {name for name, ok in droppable.items() if ok and name not in reads}
+    if len(unread) > 0:
+        drop_vars(body, unread)
+
+def collect_var_usage(block:CodeBlock, reads:set[str], droppable:dict[str,bool]) -> None:
+    for statement in block.statements:
+        match statement:
+            case StRet():
+                collect_reads(statement.value, reads)
+            case StVar():
+                collect_reads(statement.value, reads)
+                name = statement.name.to_str()
+                droppable[name] = droppable.get(name, True) and isinstance(statement.value.value, Num)
+            case StIncDec():
+                collect_reads(statement.value, reads)
+                name = statement.name.to_str()
+                droppable[name] = droppable.get(name, True) and isinstance(statement.value.value, Num)
+            case StCast():
+                collect_reads(statement.value, reads)
+                droppable[statement.name.to_str()] = False
+            case StIf():
+                collect_reads(statement.cond, reads)
+                collect_var_usage(statement.body, reads, droppable)
+            case StScope():
+                collect_var_usage(statement.body, reads, droppable)
+            case StFnCall():
+                for arg in statement.call.args.value:
+                    collect_reads(arg, reads)
+
+def collect_reads(value:Value, reads:set[str]) -> None:
+    match value.value:
+        case Var():
+            reads.add(value.value.name_or_value)
+        case FnCall():
+            for arg in value.value.args.value:
+                collect_reads(arg, reads)
+        case Num():
+            pass
+
+def drop_vars(block:CodeBlock, names:set[str]) -> None:
+    statements:list[Statement] = []
+
+    for statement in block.statements:
+        match statement:
+            case StVar() | StIncDec():
+                if statement.name.to_str() in names:
+                    continue
+            case StIf() | StScope():
+                drop_vars(statement.body, names)
+        statements.append(statement)
+
+    block.statements = statements
+
+######
+###### call graph and linkage
+######
+
+# fn name -> names of the fns it calls (including `fn@`s), for every `fn` in the program
+def build_call_graph(program:Program) -> dict[str,set[str]]:
+    graph:dict[str,set[str]] = {}
+    for item in program.items:
+        match item:
+            case FnDefinition():
+                callees:set[str] = set()
+                collect_calls(item.body, callees)
+                graph[item.signature.name.to_str()] = callees
+            case FnDeclaration():
+                pass
+    return graph
+
+def collect_calls(block:CodeBlock, callees:set[str]) -> None:
+    for statement in block.statements:
+        match statement:
+            case StRet() | StVar() | StIncDec() | StCast():
+                collect_calls_value(statement.value, callees)
+            case StIf():
+                collect_calls_value(statement.cond, callees)
+                collect_calls(statement.body, callees)
+            case StScope():
+                collect_calls(statement.body, callees)
+            case StFnCall():
+                callees.add(statement.call.name.to_str())
+                for arg in statement.call.args.value:
+                    collect_calls_value(arg, callees)
+
+def collect_calls_value(value:Value, callees:set[str]) -> None:
+    match value.value:
+        case FnCall():
+            callees.add(value.value.name.to_str())
+            for arg in value.value.args.value:
+                collect_calls_value(arg, callees)
+        case Var() | Num():
+            pass
+
+# drops every `fn` and `fn@` that can't be reached from `main` or the `exports`
+# returns the dropped ones
+def drop_unreachable_functions(program:Program, exports:list[str]) -> list[FnDefinition|FnDeclaration]:
+    graph = build_call_graph(program)
+
+    reachable:set[str] = set()
+    todo = [FN_ENTRY_POINT] + exports
+    while len(todo) > 0:
+        name = todo.pop()
+        if name in reachable:
+            continue
+        reachable.add(name)
+        todo.extend(graph.get(name, ()))
+
+    items:list[FnDefinition|FnDeclaration] = []
+    dropped:list[FnDefinition|FnDeclaration] = []
+    for item in program.items:
+        if item.signature.name.to_str() in reachable:
+            items.append(item)
+        else:
+            dropped.append(item)
+
+    program.items = items
+    return dropped
+
+# makes every `fn` other than `main` and the `exports` static, and the static leaf fns
+# of at most `inline_threshold` statements inline
+# a `fn` that also has a `fn@` prototype is left alone, since C doesn't allow a static definition after an extern declaration
+def set_linkage(program:Program, exports:list[str], inline_threshold:int) -> None:
+    graph = build_call_graph(program)
+    called:set[str] = set().union(*graph.values())
+    external = set(exports) | {FN_ENTRY_POINT}
+    external |= {item.signature.name.to_str() for item in program.items if isinstance(item, FnDeclaration)}
+
+    for item in program.items:
+        match item:
+            case FnDefinition():
+                name = item.signature.name.to_str()
+                if name in external:
+                    continue
+                item.static = True
+                item.inline = len(graph[name]) == 0 and count_statements(item.body) <= inline_threshold
+                item.unused = not item.inline and name not in called # gcc doesn't complain about unused inline fns
+            case FnDeclaration():
+                pass
+
+def count_statements(block:CodeBlock) -> int:
+    ret = 0
+    for statement in block.statements:
+        ret += 1
+        match statement:
+            case StIf() | StScope():
+                ret += count_statements(statement.body)
+    return ret
+
+######
+###### translation units
+######
+
+# splits the program into `count` programs that can be compiled separately, the `fn@`s are left out (see `CodeGen.gen_header`)
+# every `fn` goes into the same unit as long as its name stays the same, so that the objects of the unchanged units can be reused
+# the inline fns get copied into every unit that calls them, and the static fns that are called from other units stop being static
+def split_program(program:Program, count:int) -> list[Program]:
+    graph = build_call_graph(program)
+
+    unit_of:dict[str,int] = {} # fn name -> index of the unit it goes into
+    for item in program.items:
+        if isinstance(item, FnDefinition) and not item.inline:
+            unit_of[item.signature.name.to_str()] = zlib.crc32(item.signature.name.to_str().encode()) % count
+
+    calling_units:dict[str,set[int]] = {} # fn name -> the units it's called from
+    for caller, callees in graph.items():
+        if caller not in unit_of:
+            continue
+        for callee in callees:
+            calling_units.setdefault(callee, set()).add(unit_of[caller])
+
+    units = [Program() for _ in range(count)]
+
+    for item in program.items:
+        match item:
+            case FnDefinition():
+                name = item.signature.name.to_str()
+                if item.inline:
+                    for unit in sorted(calling_units.get(name, ())):
+                        units[unit].add_another(item)
+                    continue
+
+                if item.static and not calling_units.get(name, set()).issubset({unit_of[name]}):
+                    item.static = False
+                    item.unused = False
+                units[unit_of[name]].add_another(item)
+
+            case FnDeclaration():
+                pass
+
+    return units
@@ -3,6 +3,11 @@ from typing import Generator
 from typing import NoReturn
 from typing import Callable
 from typing import Self
+from typing import ClassVar
+from typing import Any
+import collections
+import math
+import sys
 
 from constants import *
 
@@ -20,32 +25,132 @@ from constants import *
 # to act more strictly
 class CCode:
 
+    __slots__ = ('parts', 'size')
+
+    # a rope: a list of fragments that only gets joined when it's written out (see `fragments`)
+    # appended/prepended `CCode`s are kept by reference, so they must not be modified afterwards
     def __init__(self, val:str):
-        self.val = val
+        self.parts:collections.deque[str|CCode] = collections.deque()
+        self.size = 0
+        if len(val) > 0:
+            self.parts.append(val)
+            self.size = len(val)
 
     def __iadd__(self, other:'CCode') -> 'CCode':
-        self.val += other.val
+        if other.size > 0:
+            self.parts.append(other.as_part())
+            self.size += other.size
         return self
+
+    def prepend(self, other:'CCode') -> None:
+        if other.size > 0:
+            self.parts.appendleft(other.as_part())
+            self.size += other.size
     
     def __repr__(self) -> str: # TODO as of 2025.02.22 we're still relying on this in the code, the affected code needs to use `as_str` instead
         assert False, 'calling __repr__ on CCode'
 
+    # no need to keep a whole node around for a single fragment
+    def as_part(self) -> 'str|CCode':
+        if len(self.parts) == 1:
+            return self.parts[0]
+        return self
+
+    def fragments(self) -> Generator[str]:
+        stack = [iter(self.parts)]
+        while len(stack) > 0:
+            for part in stack[-1]:
+                if isinstance(part, str):
+                    yield part
+                else:
+                    stack.append(iter(part.parts))
+                    break
+            else:
+                stack.pop()
+
+    def fragments_reversed(self) -> Generator[str]:
+        stack = [reversed(self.parts)]
+        while len(stack) > 0:
+            for part in stack[-1]:
+                if isinstance(part, str):
+                    yield part
+                else:
+                    stack.append(reversed(part.parts))
+                    break
+            else:
+                stack.pop()
+
     def to_str(self) -> str:
-        return f'{self.val}'
+        return ''.join(self.fragments())
 
     def to_TypeTuple(self) -> 'TypeTuple':
         return TypeTuple(any_=True)
 
     def empty(self) -> bool:
-        return len(self.val) == 0
+        return self.size == 0
+
+    # only looks at as many fragments as needed, which is usually just the last one
+    def endswith(self, end:str) -> bool:
+        if self.size < len(end):
+            return False
+
+        tail = ''
+        for part in self.fragments_reversed():
+            tail = part + tail
+            if len(tail) >= len(end):
+                break
+
+        return tail.endswith(end)
+
+    def startswith(self, start:str) -> bool:
+        if self.size < len(start):
+            return False
+
+        head = ''
+        for part in self.fragments():
+            head += part
+            if len(head) >= len(start):
+                break
+
+        return head.startswith(start)
 
     def del_if_endswith(self, end:'CCode') -> None:
-        if self.val.endswith(end.val):
-            self.val = self.val[:-len(end.val)]
+        end_str = end.to_str()
+        if not self.endswith(end_str):
+            return
+
+        left = len(end_str)
+        self.size -= left
+
+        while left > 0:
+            part = self.parts.pop()
+            if isinstance(part, str):
+                if len(part) > left:
+                    self.parts.append(part[:-left])
+                    left = 0
+                else:
+                    left -= len(part)
+            else:
+                self.parts.extend(part.parts) # the node itself might be shared, so only take its fragments
 
     def del_if_startswith(self, start:'CCode') -> None:
-        if self.val.startswith(start.val):
-            self.val = self.val[len(start.val):]
+        start_str = start.to_str()
+        if not self.startswith(start_str):
+            return
+
+        left = len(start_str)
+        self.size -= left
+
+        while left > 0:
+            part = self.parts.popleft()
+            if isinstance(part, str):
+                if len(part) > left:
+                    self.parts.appendleft(part[left:])
+                    left = 0
+                else:
+                    left -= len(part)
+            else:
+                self.parts.extendleft(reversed(part.parts))
 
 CC_SPACE = CCode(' ')
 CC_SEMICOLON_NL = CCode(';\n')
@@ -54,6 +159,9 @@ CC_OB = CCode('(')
 CC_CB = CCode(')')
 CC_COMMA_SPACE = CCode(', ')
 CC_WARNUNUSEDRESULT_SPACE = CCode('__attribute__((warn_unused_result)) ')
+CC_STATIC_SPACE = CCode('static ')
+CC_INLINE_SPACE = CCode('inline __attribute__((always_inline)) ') # plain `inline` does nothing without `-O`
+CC_UNUSED_SPACE = CCode('__attribute__((unused)) ')
 CC_CBO = CCode('{')
 CC_CBC = CCode('}')
 CC_NL = CCode('\n')
@@ -65,6 +173,8 @@ CC_NL = CCode('\n')
 
 class BaseParserThingClass:
 
+    __slots__ = ()
+
     def __repr__(self) -> NoReturn:
         assert False, f'trying to call __repr__ on {type(self)}'
     
@@ -72,19 +182,61 @@ class BaseParserThingClass:
         assert False, f'trying to call __eq__ on {type(self)}'
 
 ######
-###### var name
+###### interned names
 ######
 
-class VarName(BaseParserThingClass):
+# ? maybe we could omit the `$` to make the code a bit more readable and compliant
+C_NAME_MANGLING = str.maketrans({
+    '-': '$M$',
+    '+': '$P$',
+    '(': '$OB$',
+    ')': '$CB$',
+})
 
-    def __init__(self, name:str):
-        self.name = name
+# every distinct name exists only once (per class), so `matches` can just compare identities
+class InternedParserThingClass(BaseParserThingClass):
+
+    __slots__ = ('name', 'mangled')
+
+    interned:ClassVar[dict[str,Any]]
+
+    name:str
+    mangled:None|str # the C spelling, computed on first use
+
+    def __init_subclass__(cls) -> None:
+        cls.interned = {}
+
+    def __new__(cls, name:str) -> Self:
+        self:None|Self = cls.interned.get(name)
+        if self is None:
+            self = super().__new__(cls)
+            self.name = sys.intern(name)
+            self.mangled = None
+            cls.interned[self.name] = self
+        return self
+
+    # so that unpickling (when passing things between processes) goes through the interning as well
+    def __reduce__(self) -> tuple[type[Self], tuple[str]]:
+        return type(self), (self.name,)
 
     def to_str(self) -> str:
-        return f'{self.name}'
+        return self.name
+
+    def to_mangled(self) -> str:
+        if self.mangled is None:
+            self.mangled = self.name.translate(C_NAME_MANGLING)
+        return self.mangled
+
+######
+###### var name
+######
+
+class VarName(InternedParserThingClass):
+
+    __slots__ = ()
 
     def matches(self, other:Self) -> bool:
-        return self.name == other.name
+        return self is other
     def matches_str(self, other:str) -> bool:
         return self.name == other
     
@@ -95,69 +247,84 @@ class VarName(BaseParserThingClass):
         return Type(self.name)
     
     def to_ccode(self) -> CCode:
-        # ? maybe we could omit the `$` to make the code a bit more readable and compliant
-        name = self.name
-        name = name.replace('-', '$M$')
-        name = name.replace('+', '$P$')
-        name = name.replace('(', '$OB$')
-        name = name.replace(')', '$CB$')
-        return CCode(name)
+        return CCode(self.to_mangled())
 
 ######
 ###### fn name
 ######
 
-class FnName(BaseParserThingClass):
-
-    def __init__(self, name:str):
-        self.name = name
+class FnName(InternedParserThingClass):
 
-    def to_str(self) -> str:
-        return f'{self.name}'
+    __slots__ = ()
 
     def to_ccode(self) -> CCode:
-        return VarName(self.name).to_ccode()
+        return CCode(self.to_mangled())
 
     def matches(self, other:Self) -> bool:
-        return self.name == other.name
+        return self is other
 
 ######
 ###### type
 ######
 
-class Type(BaseParserThingClass):
+class Type(InternedParserThingClass):
 
-    def __init__(self, typ:str):
-        self.typ = typ
-
-    def to_str(self) -> str:
-        return f'{self.typ}'
+    __slots__ = ()
 
     def to_ccode(self) -> CCode:
-        if self.matches(TYPE_COMPTIME_STR):
+        if self is TYPE_COMPTIME_STR or self is TYPE_ANY:
             return CCode('char*')
-        return VarName(self.typ).to_ccode()
+        return CCode(self.to_mangled())
 
     def matches(self, other:Self) -> bool:
-        if self.typ == 'any' or other.typ == 'any':
+        if self is TYPE_ANY or other is TYPE_ANY:
+            return True
+
+        # a number literal becomes whatever C type it's used as
+        if self is TYPE_COMPTIME_NUM or other is TYPE_COMPTIME_NUM:
             return True
 
-        return self.typ == other.typ
+        return self is other
 
 TYPE_COMPTIME_STR = Type('comptime_str')
 TYPE_CSTR = Type('char*')
 TYPE_ANY = Type('any') # special placeholder type that needs to go later
+TYPE_COMPTIME_NUM = Type('comptime_num')
 # TYPE_CSTR = Type('char*') # TODO better idea to use this I think
 
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+UINT64_MAX = (1 << 64) - 1
+
+# the C integer types whose arithmetic we can do at compile time
+# name -> (bits, signed, literal suffix)
+COMPTIME_INT_TYPES:dict[str,tuple[int,bool,str]] = {
+    'int': (32, True, ''),
+    'short': (16, True, ''), # there's no suffix for `short`, but the literal gets promoted to `int` anyway
+    'long': (64, True, 'L'),
+    'unsigned': (32, False, 'U'),
+}
+
+# converts the value as C would when assigning it to a variable of type `typ` (we compile with `-fwrapv`)
+def wrap_int(value:int, typ:Type) -> int:
+    bits, signed, _suffix = COMPTIME_INT_TYPES[typ.to_str()]
+    value &= (1 << bits) - 1
+    if signed and value >= 1 << (bits - 1):
+        value -= 1 << bits
+    return value
+
 ######
 ###### type tuple
 ######
 
 class TypeTuple(BaseParserThingClass):
 
-    def __init__(self, any_:bool=False) -> None:
+    __slots__ = ('any', 'vals')
+
+    def __init__(self, vals:tuple[Type,...]=(), any_:bool=False) -> None:
+        assert not (any_ and len(vals) > 0)
         self.any = any_
-        self.vals:list[Type] = []
+        self.vals = vals
 
     def to_str(self) -> str:
         ret = ''
@@ -179,10 +346,6 @@ class TypeTuple(BaseParserThingClass):
                 return False
         
         return True
-    
-    def add_another(self, val:Type) -> None:
-        assert not self.any
-        self.vals.append(val)
 
 ######
 ###### fn decl args
@@ -190,8 +353,11 @@ class TypeTuple(BaseParserThingClass):
 
 class FnDeclArgs(BaseParserThingClass):
 
-    def __init__(self) -> None:
-        self.args:list[tuple[VarName,Type]] = []
+    __slots__ = ('args',)
+
+    # see `arg_can_be_added` for building up `args`
+    def __init__(self, args:tuple[tuple[VarName,Type],...]) -> None:
+        self.args = args
 
     def to_str(self) -> str:
         ret = ''
@@ -223,10 +389,7 @@ class FnDeclArgs(BaseParserThingClass):
         return ret
     
     def to_TypeTuple(self) -> 'TypeTuple':
-        ret = TypeTuple()
-        for _name, typ in self.args:
-            ret.add_another(typ)
-        return ret
+        return TypeTuple(tuple(typ for _name, typ in self.args))
     
     def generator(self) -> Generator[tuple[VarName,Type]]:
         # for arg in self.args:
@@ -235,14 +398,14 @@ class FnDeclArgs(BaseParserThingClass):
         yield from self.args
 
     # 1st ret is err, 2nd ret is reason
-    def add_another(self, arg:tuple[VarName,Type]) -> tuple[bool, str]:
+    @staticmethod
+    def arg_can_be_added(args:list[tuple[VarName,Type]], arg:tuple[VarName,Type]) -> tuple[bool, str]:
         arg_name, _arg_type = arg
 
-        for name, _typ in self.args:
+        for name, _typ in args:
             if name.matches(arg_name):
                 return True, f'argument {arg_name.to_str()} already specified'
 
-        self.args.append(arg)
         return False, ''
 
 ######
@@ -251,6 +414,8 @@ class FnDeclArgs(BaseParserThingClass):
 
 class Var(BaseParserThingClass):
 
+    __slots__ = ('name_or_value', 'typ')
+
     # TODO!!!! actually, i think its about time that we got rid of `name_or_value`
     def __init__(self, name_or_value:str, typ:Type):
         self.name_or_value = name_or_value # TODO!!! `name_or_value` is stupid and makes everything more complex, it only exists because string can be their own thing and are not put into variables
@@ -260,19 +425,61 @@ class Var(BaseParserThingClass):
         return f'{self.name_or_value}{VAR_TYPE_SEP}{self.typ.to_str()}'
 
     def to_ccode(self) -> CCode:
-        if self.typ.to_str() == TYPE_COMPTIME_STR.to_str(): # kinda hacky but we can't use `matches`
+        if self.typ is TYPE_COMPTIME_STR: # can't use `matches`, it would also be true for `any`
             return CCode('"' + self.name_or_value[1:-1] + '"')
         return VarName(self.name_or_value).to_ccode() # needed so that we can have shit like `(` in the variable name
     
     def get_type(self) -> Type:
         return self.typ
 
+######
+###### num
+######
+
+# a number literal, or the compile-time value of a variable of one of `COMPTIME_INT_TYPES`
+class Num(BaseParserThingClass):
+
+    __slots__ = ('value', 'typ')
+
+    def __init__(self, value:int|float, typ:Type=TYPE_COMPTIME_NUM):
+        self.value = value
+        self.typ = typ
+
+    def to_str(self) -> str:
+        return str(self.value)
+
+    # the shortest literal that has the right value and (when used as a variable's value) the right type
+    def to_ccode(self) -> CCode:
+        value = self.value
+
+        if isinstance(value, float):
+            return CCode(repr(value))
+
+        if self.typ is TYPE_COMPTIME_NUM:
+            # an unsuffixed decimal literal gets the first of `int`, `long` and `long long` that can hold it
+            literal_max = INT64_MAX
+            suffix = 'U' if value > INT64_MAX else ''
+        else:
+            bits, signed, suffix = COMPTIME_INT_TYPES[self.typ.to_str()]
+            literal_max = (1 << (max(bits, 32) - 1)) - 1 if signed else (1 << bits) - 1
+
+        # there are no negative literals, only `-` applied to a positive one, which might not fit in the type
+        if value < 0 and -value > literal_max:
+            return CCode(f'({value + 1}{suffix} - 1)')
+
+        return CCode(f'{value}{suffix}')
+
+    def get_type(self) -> Type:
+        return self.typ
+
 ######
 ###### fn call
 ######
 
 class FnCall(BaseParserThingClass):
 
+    __slots__ = ('name', 'args', 'ret_type')
+
     # TODO!! I hate the fact taht we have to pass warn an err
     def __init__(self, name:FnName, args:'ValueTuple', ret_type:Type, original_signature:'FnSignature', warn:Callable[[str],None], err:Callable[[str],NoReturn]):
 
@@ -308,7 +515,9 @@ class FnCall(BaseParserThingClass):
 
 class Value(BaseParserThingClass):
 
-    def __init__(self, value:Var|FnCall):
+    __slots__ = ('value',)
+
+    def __init__(self, value:Var|FnCall|Num):
         self.value = value
     
     def to_str(self) -> str:
@@ -322,6 +531,8 @@ class Value(BaseParserThingClass):
             return self.value.get_ret_type()
         if isinstance(self.value, Var):
             return self.value.get_type()
+        if isinstance(self.value, Num):
+            return self.value.get_type()
         assert False
 
 ######
@@ -330,6 +541,8 @@ class Value(BaseParserThingClass):
 
 class ValueTuple(BaseParserThingClass):
 
+    __slots__ = ('value',)
+
     def __init__(self) -> None:
         self.value:list[Value] = []
     
@@ -362,10 +575,7 @@ class ValueTuple(BaseParserThingClass):
         return ret
     
     def to_TypeTuple(self) -> TypeTuple:
-        ret = TypeTuple()
-        for val in self.value:
-            ret.add_another(val.to_Type())
-        return ret
+        return TypeTuple(tuple(val.to_Type() for val in self.value))
 
     def add_another(self, item:Value) -> None:
         self.value.append(item)
@@ -376,6 +586,8 @@ class ValueTuple(BaseParserThingClass):
 
 class FnSignature:
 
+    __slots__ = ('name', 'can_ret_err', 'return_type', 'args')
+
     def __init__(self, name:FnName, can_ret_err:bool, return_type:Type, args:CCode|FnDeclArgs) -> None:
         self.name = name
         self.can_ret_err = can_ret_err
@@ -402,8 +614,9 @@ class FnSignature:
         if isinstance(self.args, CCode) or (isinstance(other.args, CCode)):
             pass
         else:
-            if self.args != other.args:
-                return False, f'arguments: {self.args} != {other.args}'
+            # only the types count, C doesn't care about the names
+            if not self.args.to_TypeTuple().matches(other.args.to_TypeTuple()):
+                return False, f'arguments: {self.args.to_str()} != {other.args.to_str()}'
         
         return True, ''
     
@@ -420,19 +633,138 @@ DUMMY_FN_SIGNATURE = FnSignature(FnName('dummy'), False, Type('int'), CCode('(vo
 
 class FnSignatures:
 
+    __slots__ = ('fns', 'lookups')
+
     def __init__(self) -> None:
-        self.fns:list[FnSignature] = []
+        self.fns:dict[str,FnSignature] = {} # fn name -> signature
+        self.lookups = 0 # for `stats.counters`
 
     def get_signature(self, name:FnName) -> tuple[bool, FnSignature]:
-        for fn in self.fns:
-            if name.matches(fn.name):
-                return True, fn
-        return False, DUMMY_FN_SIGNATURE
+        self.lookups += 1
+        fn = self.fns.get(name.name)
+        if fn is None:
+            return False, DUMMY_FN_SIGNATURE
+        return True, fn
 
     def register(self, fn:FnSignature) -> None:
-        found, _sig = self.get_signature(fn.name)
-        assert not found
-        self.fns.append(fn)
+        assert fn.name.name not in self.fns
+        self.fns[fn.name.name] = fn
+
+######
+###### SPECIAL: syntax tree
+######
+
+# the parser only builds these, turning them into C is up to `codegen.py`
+
+class CodeBlock(BaseParserThingClass):
+
+    __slots__ = ('statements',)
+
+    def __init__(self) -> None:
+        self.statements:list[Statement] = []
+
+    def add_another(self, statement:'Statement') -> None:
+        self.statements.append(statement)
+
+# `ret`
+class StRet(BaseParserThingClass):
+
+    __slots__ = ('value',)
+
+    def __init__(self, value:Value) -> None:
+        self.value = value
+
+# `val` and `var`
+class StVar(BaseParserThingClass):
+
+    __slots__ = ('name', 'typ', 'value', 'const')
+
+    def __init__(self, name:VarName, typ:Type, value:Value, const:bool) -> None:
+        self.name = name
+        self.typ = typ
+        self.value = value
+        self.const = const
+
+# `inc` and `dec`
+class StIncDec(BaseParserThingClass):
+
+    __slots__ = ('name', 'value', 'inc')
+
+    def __init__(self, name:VarName, value:Value, inc:bool) -> None:
+        self.name = name
+        self.value = value
+        self.inc = inc
+
+# `cast`
+class StCast(BaseParserThingClass):
+
+    __slots__ = ('name', 'c_type', 'value')
+
+    def __init__(self, name:VarName, c_type:CCode, value:Value) -> None:
+        self.name = name
+        self.c_type = c_type
+        self.value = value
+
+# `if`
+class StIf(BaseParserThingClass):
+
+    __slots__ = ('cond', 'body')
+
+    def __init__(self, cond:Value, body:CodeBlock) -> None:
+        self.cond = cond
+        self.body = body
+
+# `{`
+class StScope(BaseParserThingClass):
+
+    __slots__ = ('body',)
+
+    def __init__(self, body:CodeBlock) -> None:
+        self.body = body
+
+# a function call whose return value is not used
+class StFnCall(BaseParserThingClass):
+
+    __slots__ = ('call',)
+
+    def __init__(self, call:FnCall) -> None:
+        self.call = call
+
+Statement = StRet | StVar | StIncDec | StCast | StIf | StScope | StFnCall
+
+# `fn`
+class FnDefinition(BaseParserThingClass):
+
+    __slots__ = ('signature', 'args', 'body', 'strings', 'static', 'inline', 'unused')
+
+    def __init__(self, signature:FnSignature, args:FnDeclArgs, body:CodeBlock, strings:list[tuple[VarName,str]]) -> None:
+        self.signature = signature
+        self.args = args
+        self.body = body
+        self.strings = strings # the autogenerated variables for the string literals used in the body, and the literals themselves
+        # linkage, filled in by `optimize.set_linkage`
+        self.static = False
+        self.inline = False
+        self.unused = False # nothing calls it, so gcc needs to be told not to complain if it's `static`
+
+# `fn@`
+class FnDeclaration(BaseParserThingClass):
+
+    __slots__ = ('signature', 'args')
+
+    def __init__(self, signature:FnSignature, args:CCode) -> None:
+        self.signature = signature
+        self.args = args
+
+class Program(BaseParserThingClass):
+
+    __slots__ = ('items',)
+
+    def __init__(self) -> None:
+        self.items:list[FnDefinition|FnDeclaration] = []
+
+    def add_another(self, item:FnDefinition|FnDeclaration) -> None:
+        self.items.append(item)
 
 ######
 ###### SPECIAL: string check
@@ -450,17 +782,25 @@ def is_str(obj:str) -> bool:
     
     assert False
 
-def is_num(obj:str|VarName) -> bool:
-    if isinstance(obj, str):
-        val_str = obj
-    elif isinstance(obj, VarName):
-        val_str = obj.to_str()
-    else:
-        assert False, f'unhandled type {type(obj)}'
-
-    try:
-        float(val_str)
-    except ValueError:
-        return False
+# the input needs to be something the lexer considers a `TK_NUMBER`
+# raises ValueError, with the reason, for a number that C wouldn't take or that we can't represent
+def parse_num(text:str) -> int|float:
+    digits = text.lstrip('+-')
+
+    if 'x' in digits or 'X' in digits:
+        value = int(text, 16)
+    elif digits.isdigit() and len(digits) > 1 and digits.startswith('0'):
+        if digits.strip('01234567') != '':
+            raise ValueError('is not a valid octal number')
+        value = int(text, 8) # same as in C
+    elif digits.isdigit():
+        value = int(text, 10)
     else:
-        return True
+        num = float(text)
+        if math.isinf(num):
+            raise ValueError('is too big')
+        return num
+
+    if value > UINT64_MAX or value < INT64_MIN:
+        raise ValueError('does not fit in 64 bits')
+    return value
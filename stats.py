@@ -0,0 +1,97 @@
+from typing import Iterator
+import collections
+import contextlib
+import tracemalloc
+import cProfile
+import pstats
+import json
+import time
+import sys
+import os
+
+# where the compile time goes: how long each phase of the compiler takes, and how much work the hot paths do
+
+# filled in by whatever does the work, once it's done with it (see `Lexer.close`, `Src.__exit__`, `CodeGen.__exit__`)
+counters:collections.Counter[str] = collections.Counter()
+
+CNT_CHARS_LEXED = 'chars lexed'
+CNT_TOKENS_LEXED = 'tokens lexed'
+CNT_PEEKS = 'token peeks'
+CNT_FN_LOOKUPS = 'FnSignatures lookups'
+CNT_VARS_REGISTERED = 'vars registered'
+CNT_BYTES_EMITTED = 'bytes of C emitted'
+
+# includes the time of the child processes that have finished (gcc, the parser processes, ...)
+def cpu_time() -> float:
+    children = os.times()
+    return time.process_time() + children.children_user + children.children_system
+
+class PhaseTimes:
+
+    def __init__(self) -> None:
+        self.phases:dict[str,tuple[float,float]] = {} # phase -> wall time, cpu time
+
+    @contextlib.contextmanager
+    def phase(self, name:str) -> Iterator[None]:
+        wall = time.perf_counter()
+        cpu = cpu_time()
+        try:
+            yield
+        finally:
+            total_wall, total_cpu = self.phases.get(name, (0.0, 0.0))
+            self.phases[name] = total_wall + time.perf_counter() - wall, total_cpu + cpu_time() - cpu
+
+    def to_text(self) -> str:
+        lines = [f'{"phase":<20} {"wall":>10} {"cpu":>10}']
+        for name, (wall, cpu) in self.phases.items():
+            lines.append(f'{name:<20} {wall:>9.3f}s {cpu:>9.3f}s')
+        total_wall = sum(wall for wall, _cpu in self.phases.values())
+        total_cpu = sum(cpu for _wall, cpu in self.phases.values())
+        lines.append(f'{"total":<20} {total_wall:>9.3f}s {total_cpu:>9.3f}s')
+
+        lines.append('')
+        for name, value in sorted(counters.items()):
+            lines.append(f'{name:<20} {value:>21}')
+
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'phases': {name: {'wall': wall, 'cpu': cpu} for name, (wall, cpu) in self.phases.items()},
+            'counters': dict(sorted(counters.items())),
+        }, indent=4) + '\n'
+
+    # `fmt` - `text` or `json`
+    # `file_out` - None for stderr
+    def write(self, fmt:str, file_out:None|str) -> None:
+        report = self.to_json() if fmt == 'json' else self.to_text()
+        if file_out is None:
+            sys.stderr.write(report)
+        else:
+            with open(file_out, 'w') as f:
+                f.write(report)
+
+# `cprofile` prints the hottest fns, `trace_memory` the peak memory and the biggest allocations; to stderr, once done
+@contextlib.contextmanager
+def profiled(cprofile:bool, trace_memory:bool) -> Iterator[None]:
+    profiler = None
+    if cprofile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    if trace_memory:
+        tracemalloc.start()
+
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(25)
+
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            _current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f'peak traced memory: {peak} bytes', file=sys.stderr)
+            for stat in snapshot.statistics('lineno')[:10]:
+                print(stat, file=sys.stderr)
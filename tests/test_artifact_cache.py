@@ -0,0 +1,86 @@
+import unittest
+import tempfile
+import time
+import sys
+import os
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+# pylint: disable=wrong-import-position
+from artifact_cache import ArtifactCache
+from artifact_cache import FOLDER_INCOMPLETE
+
+class TestArtifactCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.folder = os.path.join(self.tmp.name, 'cache')
+        self.dest = os.path.join(self.tmp.name, 'dest')
+
+    # returns the path of a new file of `size` bytes of `content`
+    def artifact(self, content:bytes, size:int) -> str:
+        path = os.path.join(self.tmp.name, f'artifact-{content.decode()}')
+        with open(path, 'wb') as f:
+            f.write(content * size)
+        os.chmod(path, 0o755)
+        return path
+
+    def test_miss_then_hit(self) -> None:
+        cache = ArtifactCache(self.folder, 1 << 20)
+        src = self.artifact(b'a', 100)
+
+        self.assertFalse(cache.get('key', self.dest))
+        cache.put('key', src)
+        self.assertTrue(cache.get('key', self.dest))
+
+        with open(self.dest, 'rb') as f:
+            self.assertEqual(f.read(), b'a' * 100)
+        self.assertTrue(os.access(self.dest, os.X_OK))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # the counters are kept on disk
+        cache = ArtifactCache(self.folder, 1 << 20)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_key(self) -> None:
+        cache = ArtifactCache(self.folder, 1 << 20)
+        src = self.artifact(b'a', 100)
+
+        key = cache.key([src], ['-O2'], 'gcc 1')
+        self.assertEqual(key, cache.key([src], ['-O2'], 'gcc 1'))
+        self.assertNotEqual(key, cache.key([src], ['-O3'], 'gcc 1'))
+        self.assertNotEqual(key, cache.key([src], ['-O2'], 'gcc 2'))
+        self.assertNotEqual(key, cache.key([self.artifact(b'b', 100)], ['-O2'], 'gcc 1'))
+
+    def test_eviction(self) -> None:
+        cache = ArtifactCache(self.folder, 250)
+
+        cache.put('old', self.artifact(b'a', 100))
+        time.sleep(0.01) # for the mtimes to differ
+        cache.put('used', self.artifact(b'b', 100))
+        time.sleep(0.01)
+        self.assertTrue(cache.get('old', self.dest)) # now the most recently used
+        time.sleep(0.01)
+        cache.put('new', self.artifact(b'c', 100))
+
+        self.assertFalse(cache.get('used', self.dest))
+        self.assertTrue(cache.get('old', self.dest))
+        self.assertTrue(cache.get('new', self.dest))
+
+    def test_eviction_leaves_incomplete_alone(self) -> None:
+        cache = ArtifactCache(self.folder, 0)
+
+        # as left by a `put` of another process, that hasn't been moved in yet
+        incomplete = os.path.join(self.folder, FOLDER_INCOMPLETE, 'key.1.2')
+        with open(incomplete, 'wb') as f:
+            f.write(b'x' * 100)
+
+        cache.put('key', self.artifact(b'a', 100))
+
+        self.assertTrue(os.path.isfile(incomplete))
+        self.assertFalse(cache.get('key', self.dest)) # too big to be kept
+
+if __name__ == '__main__':
+    unittest.main()
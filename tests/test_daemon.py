@@ -0,0 +1,131 @@
+from typing import Any
+import contextlib
+import unittest
+import tempfile
+import shutil
+import io
+import sys
+import os
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+# pylint: disable=wrong-import-position
+from parser_types import FnDefinition
+from daemon import Daemon
+
+MODULES = {
+    'a': '''fn fa:int [x:int]
+{
+    ret x
+}
+''',
+    'b': '''fn fb:int [x:int]
+{
+    var y:int x
+    inc y 1
+    ret y
+}
+''',
+    'main': '''import a
+import b
+
+fn main:int []
+{
+    var r:int fa[1]
+    inc r fb[2]
+    ret r
+}
+''',
+}
+
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for name, code in MODULES.items():
+            self.write(name, code)
+
+        self.daemon = Daemon(os.path.join(self.tmp.name, 'main.yasl'))
+        self.addCleanup(self.daemon.pool.shutdown)
+
+    def write(self, module:str, code:str) -> None:
+        with open(os.path.join(self.tmp.name, f'{module}.yasl'), 'w') as f:
+            f.write(code)
+
+    # returns the names of the fns, None if there were errors, and the output
+    def parse(self) -> tuple[None|list[str], str]:
+        out = io.StringIO()
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            program = self.daemon.parse(out)
+        self.assertEqual(stderr.getvalue(), '') # everything goes to `out`
+
+        if program is None:
+            return None, out.getvalue()
+        return [item.signature.name.to_str() for item in program.items if isinstance(item, FnDefinition)], out.getvalue()
+
+    def test_parse(self) -> None:
+        names, output = self.parse()
+        self.assertEqual(names, ['fa', 'fb', 'main'])
+        self.assertEqual(output, '')
+
+        # nothing changed, so the modules get reused
+        names, output = self.parse()
+        self.assertEqual(names, ['fa', 'fb', 'main'])
+
+    def test_errors_get_repeated(self) -> None:
+        self.parse()
+        self.write('a', MODULES['a'].replace('ret x', 'ret nope'))
+
+        for _ in range(2): # the second time, the module doesn't get parsed again, but the error still gets shown
+            names, output = self.parse()
+            self.assertIsNone(names)
+            self.assertIn('a.yasl', output)
+            self.assertIn('`nope`', output)
+
+        self.write('a', MODULES['a'])
+        names, output = self.parse()
+        self.assertEqual(names, ['fa', 'fb', 'main'])
+        self.assertEqual(output, '')
+
+    # with both of them changed, they get parsed by the pool
+    def test_parse_in_parallel(self) -> None:
+        self.parse()
+        self.write('a', MODULES['a'].replace('ret x', 'ret nope'))
+        self.write('b', MODULES['b'].replace('ret y', 'ret also-nope'))
+
+        names, output = self.parse()
+        self.assertIsNone(names)
+        self.assertIn('`nope`', output)
+        self.assertIn('`also-nope`', output)
+
+    def test_invalid_request(self) -> None:
+        requests:list[tuple[dict[str,Any],str]] = [({'profile': 'fast'}, '`fast`'), ({'units': 0}, '`0`'), ({'pretty': 'no'}, '`no`')]
+        for request, error in requests:
+            response = self.daemon.build(request)
+            self.assertFalse(response['ok'])
+            self.assertIn(error, response['output'])
+
+    # like while an editor saves the module, by renaming a new file over it
+    @unittest.skipIf(shutil.which('gcc') is None, 'needs gcc')
+    def test_missing_module(self) -> None:
+        self.assertTrue(self.daemon.build({})['ok'])
+
+        main = os.path.join(self.tmp.name, 'main.yasl')
+        os.rename(main, main + '.new')
+
+        self.daemon.refresh() # what the watcher does, which would've ended it
+        response = self.daemon.build({})
+        self.assertFalse(response['ok'])
+        self.assertIn('main.yasl', response['output'])
+
+        os.rename(main + '.new', main)
+
+        self.daemon.refresh()
+        response = self.daemon.build({})
+        self.assertTrue(response['ok'], response['output'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import tempfile
+import io
+import sys
+import os
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+# pylint: disable=wrong-import-position
+from parser_types import FnDefinition
+from yasl import parse_module
+
+# an error in each of `a` and `b` (two in `b`, in different statements), and none in `c`
+CODE = '''fn a:int []
+{
+    ret nope
+}
+
+fn b:int []
+{
+    var x:int also-nope
+    var y:int x
+    ret still-nope
+}
+
+fn c:int []
+{
+    ret 1
+}
+'''
+
+class TestDiagnostics(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.file_in = os.path.join(self.tmp.name, 'code.yasl')
+        with open(self.file_in, 'w') as f:
+            f.write(CODE)
+
+    # returns the number of errors, what got printed, and the names of the fns that got parsed
+    def parse(self, max_errors:None|int) -> tuple[int, str, list[str]]:
+        out = io.StringIO()
+        program, _exports, _counters, errors = parse_module(self.file_in, [], None, max_errors, out)
+        names = [item.signature.name.to_str() for item in program.items if isinstance(item, FnDefinition)]
+        return errors, out.getvalue(), names
+
+    def test_all_errors(self) -> None:
+        errors, output, names = self.parse(None)
+
+        self.assertEqual(errors, 3)
+        lines = output.splitlines()
+        self.assertEqual(len(lines), 3)
+        for line, (row, variable) in zip(lines, [(3, 'nope'), (8, 'also-nope'), (10, 'still-nope')], strict=True):
+            self.assertTrue(line.startswith(f'ERROR: file `{self.file_in}`: line {row}: '), line)
+            self.assertIn(f'`{variable}`', line)
+
+        self.assertIn('c', names) # parsing went on after the errors
+
+    def test_max_errors(self) -> None:
+        errors, output, names = self.parse(2)
+
+        self.assertEqual(errors, 2)
+        self.assertNotIn('still-nope', output)
+        self.assertIn('stopping after 2 errors', output)
+        self.assertNotIn('c', names) # the rest of the file doesn't get parsed
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import tempfile
+import sys
+import os
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+# pylint: disable=wrong-import-position
+from yasl import parse_module
+from fn_cache import FnCache
+
+CODE = '''fn@ printf:int (const char *restrict format, ...)
+
+fn g:int [a:int]
+{
+    printf['g\\n']
+    ret a
+}
+
+fn f:int [a:int]
+{
+    var r:int g[2]
+    inc r a
+    ret r
+}
+
+fn main:int []
+{
+    printf['%d\\n' f[1]]
+    ret 0
+}
+'''
+
+# remembers which fns got parsed, rather than coming out of the cache
+class RecordingFnCache(FnCache):
+
+    def __init__(self, folder:str, max_bytes:int=1 << 30) -> None:
+        super().__init__(folder, max_bytes)
+        self.puts:list[str] = []
+
+    def put(self, key:str, data:bytes) -> None:
+        super().put(key, data)
+        self.puts.append(key)
+
+class TestFnCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.file_in = os.path.join(self.tmp.name, 'code.yasl')
+        self.folder = os.path.join(self.tmp.name, 'fn_cache')
+
+    # returns how many fns got parsed
+    def parse(self, code:str) -> int:
+        with open(self.file_in, 'w') as f:
+            f.write(code)
+
+        cache = RecordingFnCache(self.folder)
+        _program, _exports, _counters, errors = parse_module(self.file_in, [], cache, None)
+        self.assertEqual(errors, 0)
+        return len(cache.puts)
+
+    def test_unchanged(self) -> None:
+        self.assertEqual(self.parse(CODE), 3)
+        self.assertEqual(self.parse(CODE), 0)
+
+    def test_callee_signature_changed(self) -> None:
+        self.parse(CODE)
+        # `g` changes, and so does `f` since it calls `g`; `main` only calls `f`, whose signature stays the same
+        self.assertEqual(self.parse(CODE.replace('fn g:int [a:int]', 'fn g:int [a:long]')), 2)
+
+    def test_string_added_before(self) -> None:
+        self.parse(CODE)
+        # the names of the string variables are per fn, so the fns after `g` stay cached
+        self.assertEqual(self.parse(CODE.replace("printf['g\\n']", "printf['g\\n']\n    printf['more\\n']")), 1)
+
+    def test_broken_entry(self) -> None:
+        self.parse(CODE)
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if os.path.isfile(path):
+                with open(path, 'wb') as f:
+                    f.write(b'\x80\x04\x95garbage')
+        self.assertEqual(self.parse(CODE), 3)
+
+    def test_eviction(self) -> None:
+        self.parse(CODE)
+        entries = [name for name in os.listdir(self.folder) if os.path.isfile(os.path.join(self.folder, name))]
+        self.assertEqual(len(entries), 3)
+
+        FnCache(self.folder, 0) # evicts everything once created
+        entries = [name for name in os.listdir(self.folder) if os.path.isfile(os.path.join(self.folder, name))]
+        self.assertEqual(entries, [])
+
+if __name__ == '__main__':
+    unittest.main()
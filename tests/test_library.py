@@ -0,0 +1,89 @@
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import unittest
+import tempfile
+import shutil
+import io
+import sys
+import os
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+# pylint: disable=wrong-import-position
+import library
+
+CODE = '''fn sq:int [a:int]
+{
+    var r:int 0
+    inc r a
+    ret r
+}
+
+fn add-int:int [a:int b:int]
+{
+    var s:int sq[a]
+    inc s b
+    ret s
+}
+
+fn twice:long [x:long]
+{
+    var r:long x
+    inc r x
+    ret r
+}
+'''
+
+@unittest.skipIf(shutil.which('gcc') is None, 'needs gcc')
+class TestLibrary(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.file_in = os.path.join(self.tmp.name, 'code.yasl')
+        with open(self.file_in, 'w') as f:
+            f.write(CODE)
+
+        # the caches and the libraries, so that the repo's own don't get touched
+        for name in ['FOLDER_LIBRARIES', 'FOLDER_FN_CACHE', 'FOLDER_GCC_CACHE']:
+            patcher = mock.patch.object(library, name, os.path.join(self.tmp.name, name.lower()))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def load(self, exports:list[str], file_in:None|str=None) -> library.Library:
+        with contextlib.redirect_stderr(io.StringIO()):
+            return library.load(file_in or self.file_in, exports, 'debug')
+
+    def test_call(self) -> None:
+        lib = self.load(['add-int', 'twice'])
+
+        self.assertEqual(lib['add-int'](6, 8), 14)
+        self.assertEqual(lib['add-int'](-6, 2), -4)
+        self.assertEqual(lib['twice'](1 << 40), 1 << 41) # doesn't fit in an `int`
+
+        self.assertTrue('twice' in lib)
+        self.assertFalse('sq' in lib) # not exported
+        with self.assertRaises(KeyError):
+            lib['sq'] # pylint: disable=pointless-statement
+
+    def test_unknown_export(self) -> None:
+        with self.assertRaises(library.LibraryError):
+            self.load(['add-itn'])
+
+    # each `load` generates and builds in a folder of its own, so they don't overwrite each other's C
+    def test_concurrent(self) -> None:
+        file_other = os.path.join(self.tmp.name, 'other.yasl')
+        with open(file_other, 'w') as f:
+            f.write(CODE.replace('inc r x', 'inc r x\n    inc r x')) # `twice` becomes thrice
+
+        with ThreadPoolExecutor() as pool:
+            futures = [pool.submit(self.load, ['twice'], file_in) for file_in in [self.file_in, file_other] * 4]
+            libs = [future.result() for future in futures]
+
+        for lib, expected in zip(libs, [2, 3] * 4, strict=True):
+            self.assertEqual(lib['twice'](5), 5 * expected)
+
+if __name__ == '__main__':
+    unittest.main()
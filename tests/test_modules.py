@@ -0,0 +1,57 @@
+import unittest
+import tempfile
+import io
+import sys
+import os
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+# pylint: disable=wrong-import-position
+from parser_types import FnDeclaration
+from parser_types import Program
+from modules import merge_modules
+from yasl import parse_module
+
+class TestMergeModules(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def module(self, name:str, code:str) -> tuple[Program, str]:
+        path = os.path.join(self.tmp.name, f'{name}.yasl')
+        with open(path, 'w') as f:
+            f.write(code)
+        program, _exports, _counters, errors = parse_module(path, [], None, None)
+        self.assertEqual(errors, 0)
+        return program, path
+
+    # returns the merged program, None if it exited, and the output
+    def merge(self, codes:dict[str,str]) -> tuple[None|Program, str]:
+        modules = [self.module(name, code) for name, code in codes.items()]
+        out = io.StringIO()
+        try:
+            program = merge_modules([program for program, _path in modules], [path for _program, path in modules], out)
+        except SystemExit:
+            return None, out.getvalue()
+        return program, out.getvalue()
+
+    def test_same_declaration(self) -> None:
+        program, output = self.merge({'a': 'fn@ foo:int [a:int]\n', 'b': 'fn@ foo:int [b:int]\n'})
+
+        assert program is not None
+        self.assertEqual(output, '')
+        self.assertEqual(len([item for item in program.items if isinstance(item, FnDeclaration)]), 1)
+
+    # otherwise the C would only get the first one, while `b` got type checked against its own
+    def test_conflicting_declarations(self) -> None:
+        program, output = self.merge({'a': 'fn@ foo:int [a:int]\n', 'b': 'fn@ foo:double [a:double]\n'})
+
+        self.assertIsNone(program)
+        self.assertIn('`foo`', output)
+        self.assertIn('a.yasl', output)
+        self.assertIn('b.yasl', output)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,466 @@
+import unittest
+import tempfile
+import sys
+import os
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+# pylint: disable=wrong-import-position
+from parser_types import Program
+from parser_types import FnName
+from parser_types import FnDefinition
+from parser_types import FnDeclaration
+from optimize import fold_constants
+from optimize import ComptimeEvaluator
+from optimize import COMPTIME_MAX_DEPTH
+from optimize import set_linkage
+from optimize import drop_unreachable_functions
+from optimize import split_program
+from codegen import gen_c
+from codegen import FILE_OUTPUT_HEADER
+from yasl import parse_module
+
+PRINTF = 'fn@ printf:int (const char *restrict format, ...)\n'
+
+class OptimizeTestCase(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def parse(self, code:str) -> Program:
+        path = os.path.join(self.tmp.name, 'code.yasl')
+        with open(path, 'w') as f:
+            f.write(code)
+        program, _exports, _counters, errors = parse_module(path, [], None, None)
+        self.assertEqual(errors, 0)
+        return program
+
+    # fn name -> the `fn`
+    def fns(self, program:Program) -> dict[str,FnDefinition]:
+        return {item.signature.name.to_str(): item for item in program.items if isinstance(item, FnDefinition)}
+
+    # the generated C of all the units, one after the other
+    def gen(self, program:Program, units:int=1) -> str:
+        ret = ''
+        for files in gen_c(program, self.tmp.name, units, False):
+            with open(files[0]) as f:
+                ret += f.read()
+        return ret
+
+class TestFoldConstants(OptimizeTestCase):
+
+    def fold(self, body:str) -> str:
+        program = self.parse(PRINTF + 'fn f:int [c:int]\n{\n' + body + '}\n')
+        fold_constants(program)
+        return self.gen(program)
+
+    # the same way C does with `-fwrapv`, according to the type of the variable
+    def test_wrapping(self) -> None:
+        code = self.fold('''var s:short 32767
+inc s 1
+var i:int 2147483647
+inc i 1
+var u:unsigned 0
+dec u 1
+var l:long 9223372036854775807
+inc l 1
+printf['%d %d %u %ld' s i u l]
+ret 0
+''')
+
+        self.assertIn('printf($autogen$f$0$, -32768, (-2147483647 - 1), 4294967295U, (-9223372036854775807L - 1));', code)
+        self.assertNotIn('int i', code) # not read anymore, so dropped along with the `inc`s and `dec`s
+
+    # the `if` might not run, so `k` is unknown after it
+    def test_if_invalidates(self) -> None:
+        code = self.fold('''var k:int 1
+var n:int 2
+if c
+{
+    inc k 1
+    printf['%d' k]
+}
+printf['%d %d' k n]
+ret k
+''')
+
+        self.assertIn('int k = 1;', code)
+        self.assertIn('k+=1;', code)
+        self.assertIn('printf($autogen$f$0$, 2);', code) # known inside the `if`, before the `inc`
+        self.assertIn('printf($autogen$f$1$, k, 2);', code) # `n` is untouched by the `if`
+        self.assertIn('return k;', code)
+
+    def test_name_reused_after_scope(self) -> None:
+        code = self.fold('''{
+    var a:int 5
+    printf['%d' a]
+}
+var a:int 7
+ret a
+''')
+
+        self.assertIn('printf($autogen$f$0$, 5);', code)
+        self.assertIn('return 7;', code)
+        self.assertNotIn('int a', code)
+
+    # these might have side effects, so they stay
+    def test_kept_vars(self) -> None:
+        code = self.fold('''var a:int printf['x']
+var b:int 1
+inc b printf['y']
+ret 0
+''')
+
+        self.assertIn('int a = printf(', code)
+        self.assertIn('int b = 1;', code)
+        self.assertIn('b+=printf(', code)
+
+COMPTIME = PRINTF + '''fn add:int [a:int b:int]
+{
+    var r:int a
+    inc r b
+    ret r
+}
+
+fn twice-add:int [a:int]
+{
+    var r:int add[a 1]
+    inc r add[a 1]
+    ret r
+}
+
+fn forever:int [a:int]
+{
+    ret forever[a]
+}
+
+fn next-long:long [a:long]
+{
+    var r:long a
+    inc r 1
+    ret r
+}
+
+fn to-short:short [a:int]
+{
+    ret a
+}
+
+fn prints:int [a:int]
+{
+    printf['%d' a]
+    ret a
+}
+
+fn branches:int [a:int]
+{
+    if a
+    {
+        ret 1
+    }
+    ret 0
+}
+
+fn casts:int [a:int]
+{
+    cast b:int a
+    ret b
+}
+
+fn calls-prints:int [a:int]
+{
+    ret prints[a]
+}
+'''
+
+class TestComptimeEvaluator(OptimizeTestCase):
+
+    def evaluator(self, step_budget:None|int=None) -> ComptimeEvaluator:
+        program = self.parse(COMPTIME)
+        if step_budget is None:
+            return ComptimeEvaluator(program)
+        return ComptimeEvaluator(program, step_budget)
+
+    def test_call(self) -> None:
+        comptime = self.evaluator()
+        self.assertEqual(comptime.call(FnName('add'), (2, 3)), 5)
+        self.assertEqual(comptime.call(FnName('twice-add'), (2,)), 6)
+
+    def test_memo(self) -> None:
+        comptime = self.evaluator()
+        comptime.call(FnName('twice-add'), (2,))
+
+        self.assertEqual(comptime.memo[('add', (2, 1))], 3) # the nested calls get memoized as well
+        comptime.memo[('twice-add', (2,))] = 42
+        self.assertEqual(comptime.call(FnName('twice-add'), (2,)), 42) # so it doesn't get evaluated again
+
+    def test_max_depth(self) -> None:
+        comptime = self.evaluator()
+        self.assertIsNone(comptime.call(FnName('forever'), (1,)))
+        self.assertEqual(comptime.depth, COMPTIME_MAX_DEPTH + 1)
+        self.assertGreater(comptime.steps_left, 0) # it was the depth that ran out, not the steps
+        self.assertIsNone(comptime.memo[('forever', (1,))]) # the giving up gets memoized too
+        self.assertEqual(comptime.call(FnName('add'), (2, 3)), 5) # the depth starts over
+
+    def test_step_budget(self) -> None:
+        # 3 statements of its own, and 3 of the first `add`, the second one being memoized
+        self.assertIsNone(self.evaluator(step_budget=5).call(FnName('twice-add'), (2,)))
+        self.assertEqual(self.evaluator(step_budget=6).call(FnName('twice-add'), (2,)), 6)
+
+        # the budget is per top level call
+        comptime = self.evaluator(step_budget=3)
+        self.assertEqual(comptime.call(FnName('add'), (1, 1)), 2)
+        self.assertEqual(comptime.call(FnName('add'), (1, 2)), 3)
+
+    # the same way C does with `-fwrapv`
+    def test_wrapping(self) -> None:
+        comptime = self.evaluator()
+        self.assertEqual(comptime.call(FnName('next-long'), ((1 << 63) - 1,)), -(1 << 63))
+        self.assertEqual(comptime.call(FnName('next-long'), (1 << 63,)), -(1 << 63) + 1) # the arg wraps first
+        self.assertEqual(comptime.call(FnName('to-short'), (40000,)), 40000 - (1 << 16))
+
+    def test_impure(self) -> None:
+        comptime = self.evaluator()
+        for name in ['prints', 'branches', 'casts', 'calls-prints']:
+            self.assertFalse(comptime.is_pure(FnName(name)), name)
+        for name in ['add', 'twice-add', 'forever', 'next-long', 'to-short']:
+            self.assertTrue(comptime.is_pure(FnName(name)), name)
+
+    def test_fold(self) -> None:
+        program = self.parse(COMPTIME + '''
+fn main:int []
+{
+    var a:int twice-add[2]
+    var b:int forever[1]
+    var c:int prints[3]
+    var d:int casts[4]
+    printf['%d %d %d %d' a b c d]
+    ret 0
+}
+''')
+        fold_constants(program)
+        code = self.gen(program)
+
+        self.assertIn('printf($autogen$main$0$, 6, b, c, d);', code)
+        self.assertIn('int b = forever(1);', code)
+        self.assertIn('int c = prints(3);', code)
+        self.assertIn('int d = casts(4);', code)
+
+LINKAGE = PRINTF + '''fn@ proto:int [a:int]
+
+fn proto:int [a:int]
+{
+    printf['proto']
+    ret a
+}
+
+fn leaf:int [a:int]
+{
+    ret a
+}
+
+fn big-leaf:int [a:int]
+{
+    var r:int a
+    inc r 1
+    ret r
+}
+
+fn uncalled:int [a:int]
+{
+    printf['uncalled']
+    ret a
+}
+
+fn uncalled-leaf:int [a:int]
+{
+    ret a
+}
+
+fn exported:int [a:int]
+{
+    printf['exported']
+    ret a
+}
+
+fn main:int []
+{
+    var r:int proto[1]
+    inc r leaf[2]
+    inc r big-leaf[3]
+    ret r
+}
+'''
+
+class TestLinkage(OptimizeTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.program = self.parse(LINKAGE)
+        set_linkage(self.program, ['exported'], 2)
+        self.fn = self.fns(self.program)
+
+    # returns static, inline, unused
+    def linkage(self, name:str) -> tuple[bool, bool, bool]:
+        fn = self.fn[name]
+        return fn.static, fn.inline, fn.unused
+
+    def test_external(self) -> None:
+        self.assertEqual(self.linkage('main'), (False, False, False))
+        self.assertEqual(self.linkage('exported'), (False, False, False))
+        self.assertEqual(self.linkage('proto'), (False, False, False)) # C doesn't allow a static definition after an extern declaration
+
+    def test_inline(self) -> None:
+        self.assertEqual(self.linkage('leaf'), (True, True, False))
+        self.assertEqual(self.linkage('big-leaf'), (True, False, False)) # more statements than the threshold
+
+    def test_unused(self) -> None:
+        self.assertEqual(self.linkage('uncalled'), (True, False, True))
+        self.assertEqual(self.linkage('uncalled-leaf'), (True, True, False)) # gcc doesn't complain about unused inline fns
+
+        code = self.gen(self.program)
+        self.assertIn('static __attribute__((unused)) int uncalled(int a)', code)
+        self.assertIn('static inline __attribute__((always_inline)) int leaf(int a)', code)
+        self.assertIn('\nint proto(int a)', code)
+
+UNREACHABLE = PRINTF + '''fn@ rand:int []
+fn@ puts:int (const char *s)
+
+fn dead-callee:int []
+{
+    ret rand[]
+}
+
+fn dead:int []
+{
+    ret dead-callee[]
+}
+
+fn exported-callee:int []
+{
+    ret 1
+}
+
+fn exported:int []
+{
+    ret exported-callee[]
+}
+
+fn helper:int [a:int]
+{
+    printf['%d' a]
+    ret a
+}
+
+fn main:int []
+{
+    ret helper[1]
+}
+'''
+
+class TestDropUnreachable(OptimizeTestCase):
+
+    def test_dropped(self) -> None:
+        program = self.parse(UNREACHABLE)
+        dropped = drop_unreachable_functions(program, ['exported'])
+
+        # in the order they were in
+        self.assertEqual([(type(item), item.signature.name.to_str()) for item in dropped], [
+            (FnDeclaration, 'rand'), # only called by a dropped fn
+            (FnDeclaration, 'puts'),
+            (FnDefinition, 'dead-callee'),
+            (FnDefinition, 'dead'),
+        ])
+        self.assertEqual([item.signature.name.to_str() for item in program.items], ['printf', 'exported-callee', 'exported', 'helper', 'main'])
+
+    def test_nothing_dropped(self) -> None:
+        program = self.parse(PRINTF + 'fn main:int []\n{\n    printf[\'hi\']\n    ret 0\n}\n')
+        self.assertEqual(drop_unreachable_functions(program, []), [])
+        self.assertEqual(len(program.items), 2)
+
+SPLIT = PRINTF + '''fn leaf:int [a:int]
+{
+    ret a
+}
+
+fn far:int [a:int]
+{
+    printf['far']
+    ret a
+}
+
+fn helper:int [a:int]
+{
+    printf['helper']
+    ret a
+}
+
+fn near:int [a:int]
+{
+    var r:int far[a]
+    inc r leaf[a]
+    ret r
+}
+
+fn main:int []
+{
+    var r:int near[1]
+    inc r leaf[2]
+    inc r helper[3]
+    ret r
+}
+'''
+
+class TestSplitProgram(OptimizeTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.program = self.parse(SPLIT)
+        set_linkage(self.program, [], 8)
+        self.units = split_program(self.program, 2)
+
+    # fn name -> the indexes of the units it's in
+    def units_of(self) -> dict[str,list[int]]:
+        ret:dict[str,list[int]] = {}
+        for idx, unit in enumerate(self.units):
+            for name in self.fns(unit):
+                ret.setdefault(name, []).append(idx)
+        return ret
+
+    def test_units(self) -> None:
+        units_of = self.units_of()
+
+        for name in ['far', 'helper', 'near', 'main']:
+            self.assertEqual(len(units_of[name]), 1, name)
+        self.assertEqual(sum(len(unit.items) for unit in self.units), 6) # the `fn@`s are left to the header
+
+        # the names are such that these end up in different units
+        self.assertNotEqual(units_of['near'], units_of['far'])
+        self.assertNotEqual(units_of['near'], units_of['main'])
+        self.assertEqual(units_of['helper'], units_of['main'])
+
+    # every unit that calls it gets a copy of its own
+    def test_inline_copies(self) -> None:
+        self.assertEqual(self.units_of()['leaf'], sorted(self.units_of()['near'] + self.units_of()['main']))
+        self.assertTrue(self.fns(self.program)['leaf'].static)
+
+    def test_called_from_other_units(self) -> None:
+        fn = self.fns(self.program)
+        self.assertFalse(fn['far'].static) # called by `near`
+        self.assertFalse(fn['near'].static) # called by `main`
+        self.assertTrue(fn['helper'].static) # only called from its own unit
+
+        self.gen(self.program, 2)
+        with open(os.path.join(self.tmp.name, FILE_OUTPUT_HEADER)) as f:
+            header = f.read()
+
+        self.assertIn('int printf(', header)
+        self.assertIn('int far(int a);', header)
+        self.assertIn('int near(int a);', header)
+        self.assertNotIn('helper', header)
+        self.assertNotIn('leaf', header)
+
+if __name__ == '__main__':
+    unittest.main()
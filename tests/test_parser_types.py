@@ -0,0 +1,79 @@
+import unittest
+import inspect
+import pickle
+import sys
+import os
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+# pylint: disable=wrong-import-position
+import parser_types
+from parser_types import FnDefinition
+from parser_types import VarName
+from parser_types import Type
+from parser_types import Num
+from parser_types import parse_num
+from yasl import parse_module
+
+FILE_TEST = os.path.join(os.path.dirname(HERE), 'test.yasl')
+
+class TestParserTypes(unittest.TestCase):
+
+    # so that the nodes don't each carry a `__dict__` around
+    def test_slots(self) -> None:
+        for name, cls in inspect.getmembers(parser_types, inspect.isclass):
+            if cls.__module__ != parser_types.__name__:
+                continue
+            for base in cls.__mro__[:-1]: # all but `object`
+                self.assertIn('__slots__', vars(base), f'`{base.__name__}` (a base of `{name}`) has no `__slots__`')
+
+    def test_interned(self) -> None:
+        self.assertIs(VarName('abc'), VarName('abc'))
+        self.assertIsNot(VarName('abc'), VarName('abd'))
+
+    # the fn cache and the daemon keep the syntax tree pickled, and the names need to stay interned when unpickled
+    def test_pickle(self) -> None:
+        program, _exports, _counters, errors = parse_module(FILE_TEST, [], None, None)
+        self.assertEqual(errors, 0)
+
+        copy = pickle.loads(pickle.dumps(program))
+
+        names = [item.signature.name for item in program.items if isinstance(item, FnDefinition)]
+        names_copy = [item.signature.name for item in copy.items if isinstance(item, FnDefinition)]
+        self.assertGreater(len(names), 0)
+        for name, name_copy in zip(names, names_copy, strict=True):
+            self.assertIs(name, name_copy)
+
+    def test_parse_num(self) -> None:
+        self.assertEqual(parse_num('10'), 10)
+        self.assertEqual(parse_num('010'), 8) # a leading 0 means octal, same as in C
+        self.assertEqual(parse_num('-010'), -8)
+        self.assertEqual(parse_num('0'), 0)
+        self.assertEqual(parse_num('0x1F'), 31)
+        self.assertEqual(parse_num('0.5'), 0.5)
+        self.assertEqual(parse_num('00.5'), 0.5)
+
+        for text in ['09', '1e999', '18446744073709551616', '-9223372036854775809']:
+            with self.assertRaises(ValueError, msg=text):
+                parse_num(text)
+
+    def test_num_ccode(self) -> None:
+        def ccode(value:int, typ:str) -> str:
+            return ''.join(Num(value, Type(typ)).to_ccode().fragments())
+
+        self.assertEqual(ccode(5, 'int'), '5')
+        self.assertEqual(ccode(5, 'short'), '5')
+        self.assertEqual(ccode(5, 'long'), '5L')
+        self.assertEqual(ccode(5, 'unsigned'), '5U')
+        self.assertEqual(ccode(-5, 'long'), '-5L')
+        self.assertEqual(''.join(Num(1 << 63).to_ccode().fragments()), '9223372036854775808U') # too big for a `long`
+
+        # the positive half of the most negative value doesn't fit in the type
+        self.assertEqual(ccode(-(1 << 31), 'int'), '(-2147483647 - 1)')
+        self.assertEqual(ccode(-(1 << 63), 'long'), '(-9223372036854775807L - 1)')
+        self.assertEqual(''.join(Num(-(1 << 63)).to_ccode().fragments()), '(-9223372036854775807 - 1)')
+        self.assertEqual(ccode(-(1 << 15), 'short'), '-32768') # promoted to `int`, where it fits
+
+if __name__ == '__main__':
+    unittest.main()
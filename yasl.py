@@ -12,29 +12,71 @@
 
 # from typing import NewType
 from typing import NoReturn
+from typing import TextIO
 from typing import Literal
 from typing import Any
-import subprocess
-import shutil
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import Future
+from concurrent.futures import wait
+from concurrent.futures import FIRST_COMPLETED
+import collections
+import argparse
+import hashlib
+import pickle
 import sys
 import os
 
 from parser_types import *
+from lexer import Lexer
+from lexer import map_file
+from codegen import gen_c
+from optimize import fold_constants
+from optimize import set_linkage
+from optimize import drop_unreachable_functions
+from optimize import collect_calls
+from modules import merge_modules
+from modules import sort_modules
+from modules import check_exports
+from diagnostics import Diagnostics
+from diagnostics import ParseError
+from diagnostics import ErrorLimitReached
+from diagnostics import exit_with_errors
+from artifact_cache import ArtifactCache
+from fn_cache import FnCache
+from build import Builder
+from build import BUILD_PROFILES
+from build import DEFAULT_BUILD_PROFILE
+from stats import PhaseTimes
+import stats
 from constants import *
 
 HERE = os.path.dirname(os.path.realpath(__file__))
 FOLDER_TMP = os.path.join(HERE, 'tmp')
 FILE_INPUT = os.path.join(HERE, 'test.yasl')
-FILE_TMP_OUTPUT_UGLY = os.path.join(FOLDER_TMP, 'code_ugly.c')
-FILE_TMP_OUTPUT = os.path.join(FOLDER_TMP, 'code.c')
 FILE_EXECUTABLE = os.path.join(FOLDER_TMP, 'executable')
+FILE_LIBRARY = os.path.join(FOLDER_TMP, 'libcode.so') # what `--shared` builds instead of the executable, see `library.py`
+FOLDER_FN_CACHE = os.path.join(FOLDER_TMP, 'fn_cache') # parsed fn definitions, see `Src.popif_cached_fn_definition`
+FN_CACHE_MAX_BYTES = 256 * 1024 * 1024
 
-###
-### fncs
-###
+FN_CACHE_VERSION = 3 # bump whenever the syntax tree changes, so that the old entries don't get used
+
+FOLDER_GCC_CACHE = os.path.join(FOLDER_TMP, 'gcc_cache') # executables, keyed by the generated C, the flags and the gcc version
+GCC_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+TRANSLATION_UNITS = 1 # how many `.c` files to split the generated code into, to be compiled in parallel
+
+PRETTY_C = True # indent the generated C; turn off (or pass `--no-pretty`) to save a bit of time when nobody is going to read it
 
-def term(args:list[str]) -> None:
-    subprocess.run(args, check=True)
+FOLDER_PGO = os.path.join(FOLDER_TMP, 'pgo') # the profile collected by the training run
+
+MODULE_SEARCH_PATH = [os.path.join(HERE, 'lib')] # where `import`ed modules are looked for, after the folder of the importing file
+
+AUTOGEN_PREFIX = 'autogen'
+
+MAX_ERRORS:None|int = None # per module, parsing stops once it gets this many errors; None for no limit
+
+EXPORTS:list[str] = [] # fns other than `main` that need to be visible outside of the generated C file
+INLINE_THRESHOLD = 8 # leaf fns of up to this many statements get inlined
 
 ###
 ### class src
@@ -42,47 +84,62 @@ def term(args:list[str]) -> None:
 
 class Src:
 
-    def __init__(self, file_in:str, file_out:str) -> None:
+    # `imported_functions` are the signatures exported by the modules this one imports
+    # `fn_cache` is where to keep the parsed fn definitions, None to not cache them
+    # `max_errors` - see `MAX_ERRORS`
+    # `out` - where the errors and warnings go, see `Diagnostics`
+    def __init__(self, file_in:str, imported_functions:None|list[FnSignature]=None, fn_cache:None|FnCache=None, max_errors:None|int=None, out:None|TextIO=None) -> None:
         self.file_in = file_in
+        self.fn_cache = fn_cache
+        self.diagnostics = Diagnostics(file_in, max_errors, out)
 
-        with open(file_in, 'r') as f:
-            self.src = f.read()
-        
-        self.file_out = open(file_out, 'w')
-        
-        self.line_number = 1
+        self.tokens = Lexer(map_file(file_in), self.err)
 
         self.declared_functions:FnSignatures = FnSignatures()
         self.defined_functions:FnSignatures = FnSignatures()
 
-        self.vars:list[list[tuple[VarName,Type]]] = [[]] # adding the initial "global scope" just in case
+        for fn in imported_functions or []:
+            self.declared_functions.register(fn)
+
+        # shadowing is not allowed, so any given name can only be in one of the scopes at a time
+        self.vars:list[dict[str,Type]] = [{}] # one dict per scope; adding the initial "global scope" just in case
+        self.var_scope:dict[str,int] = {} # var name -> index of the scope (in `self.vars`) it's in
 
-        self.autogen_var_idx = 0
-        self.vars_for_auto_creation:list[tuple[VarName,Type,Value]] = []
+        self.autogen_prefix = AUTOGEN_PREFIX # of the function that is currently being parsed, see `pop_fn_definition`
+        self.autogen_strings:list[tuple[VarName,str]] = [] # of the function that is currently being parsed
 
         self.scope_depth = 0
 
+        self.vars_registered = 0 # for `stats.counters`
+
     def __del__(self) -> None:
-        self.file_out.close()
+        if hasattr(self, 'tokens'): # not if the file couldn't be opened
+            self.tokens.close()
 
     def __enter__(self) -> 'Src':
         return self
 
     def __exit__(self, exc_type:Any, exc_val:Any, exc_tb:Any) -> None:
-        self.file_out.close()
+        self.tokens.close()
+        stats.counters[stats.CNT_FN_LOOKUPS] += self.declared_functions.lookups + self.defined_functions.lookups
+        stats.counters[stats.CNT_VARS_REGISTERED] += self.vars_registered
 
     def no_more_code(self) -> bool:
-        return len(self.src) == 0
-    
-    def write_ccode(self, code:CCode) -> None:
-        self.file_out.write(code.val)
+        return self.tokens.peek() is None
+
+    @property
+    def line_number(self) -> int:
+        return self.tokens.line_number()
     
-    def warn(self, warn_msg:str) -> None:
-        print(f'WARNING: file `{self.file_in}`: line {self.line_number}: {warn_msg}', file=sys.stderr)
+    def warn(self, warn_msg:str, line:None|int=None, column:None|int=None) -> None:
+        if line is None or column is None:
+            line, column = self.tokens.position()
+        self.diagnostics.warn(warn_msg, line, column)
 
+    # raises `ParseError`, see `pop_code_block_nohead` and `pop_program` for where the parsing picks up again
     def err(self, err_msg:str) -> NoReturn:
-        print(f'ERROR: file `{self.file_in}`: line {self.line_number}: {err_msg}', file=sys.stderr)
-        sys.exit(1)
+        line, column = self.tokens.position()
+        self.diagnostics.err(err_msg, line, column)
     
     # register: functions
 
@@ -118,88 +175,37 @@ class Src:
     # register: variables
 
     def register_variable(self, name:VarName, typ:Type) -> None:
-        all_vars:list[tuple[VarName,Type]] = []
-        for v in self.vars:
-            all_vars.extend(v)
-        
-        for n, _t in all_vars:
-            if n.matches(name):
-                self.err(f'variable `{name.to_str()}` alredy exists')
+        if name.to_str() in self.var_scope:
+            self.err(f'variable `{name.to_str()}` alredy exists')
 
-        self.vars[-1].append((name, typ))
+        self.vars[-1][name.to_str()] = typ
+        self.var_scope[name.to_str()] = len(self.vars) - 1
+        self.vars_registered += 1
 
     def register_FnDeclArgs(self, fn_args:FnDeclArgs) -> None:
         for name, typ in fn_args.generator():
             self.register_variable(name, typ)
 
     def get_registered_var_type(self, name:VarName) -> Type:
-        if is_num(name): # TODO after we implement the thing that makes all "floating values" into actual vars we can remove this
-            return TYPE_ANY # TODO!!! I would LOVE to make a COMPTIME_NUM type or something like that (keep in mind that we probably cannot just copy-paste the value as we do now, we would have to have something special in `.to_ccode()`)
-
-        for vs in self.vars:
-            for n, t in vs:
-                if name.matches(n):
-                    return t
-
-        assert False, f'{name.to_str()=}'
+        scope = self.var_scope.get(name.to_str())
+        if scope is None:
+            self.err(f'variable `{name.to_str()}` does not exist')
+        return self.vars[scope][name.to_str()]
     
-    # pop: whitespace
-
-    def pop_whitespace(self) -> None:
-
-        while True:
-            if len(self.src) == 0:
-                break
-
-            ch = self.src[0]
-
-            if ch in WHITESPACE:
-                self.src = self.src[1:]
-                self.line_number += ch.count(NEWLINE)
-                continue
-
-            if ch == '/':
-                if len(self.src) >= 2:
-                    if self.src[1] == '/':
-                        next_newline = self.src.find(NEWLINE)
-                        if next_newline == -1:
-                            next_newline = len(self.src)
-                        else:
-                            self.line_number += 1
-                        self.src = self.src[next_newline+1:]
-                        continue
-
-            break
-
     # pop: type separator
 
     def pop_var_type_sep(self, var_name:VarName) -> None:
-        sep = self.pop_var_name_orr(orr=VAR_TYPE_SEP)
-        self.unpop_var_name(sep)
-        if sep is not True:
-            self.err(f'variable `{var_name.to_str()}`: expected a type seperator `{VAR_TYPE_SEP}`, instead got `{sep}`')
+        if not self.tokens.popif(VAR_TYPE_SEP):
+            self.err(f'variable `{var_name.to_str()}`: expected a type seperator `{VAR_TYPE_SEP}`, instead got `{self.tokens.peek_str()}`')
     
     def pop_fn_type_sep(self, name:FnName) -> bool:
+        tok = self.tokens.peek()
 
-        for fts in FUNCTION_TYPE_SEPARATORS:
-
-            sep = self.popif_var_name(orr=fts)
-            self.unpop_var_name(sep)
-
-            if sep is True:
-                if fts == FTS_NO_ERR:
-                    return False
-                if fts == FTS_ERR:
-                    return True
-                assert False
-
-        if sep is None:
-            info = '<end of file>'
-        else:
-            assert sep is not True # make mypy happy
-            info = sep.to_str()
+        if tok is not None and tok.kind == TK_SEP and tok.text in FUNCTION_TYPE_SEPARATORS:
+            self.tokens.pop()
+            return tok.text == FTS_ERR
 
-        self.err(f'function {name.to_str()}: expected one of the function type seperators {FUNCTION_TYPE_SEPARATORS}, instead got `{info}`')
+        self.err(f'function {name.to_str()}: expected one of the function type seperators {FUNCTION_TYPE_SEPARATORS}, instead got `{self.tokens.peek_str()}`')
 
     # pop: type
 
@@ -211,17 +217,8 @@ class Src:
         return ret.to_Type()
 
     def pop_c_type(self, name:VarName) -> CCode:
-        data:CCode = CCode('')
+        data = CCode(self.tokens.pop_raw_until_whitespace())
 
-        while not self.no_more_code():
-            ch = self.src[0]
-            self.src = self.src[1:]
-
-            if ch in WHITESPACE:
-                break
-        
-            data += CCode(ch)
-                
         if data.empty():
             self.err(f'a C type needs to be specified for `{name.to_str()}`')
 
@@ -230,27 +227,20 @@ class Src:
     # pop: var name
 
     def popif_var_name(self, orr:None|str) -> None|Literal[True]|VarName:
-        self.pop_whitespace()
-
-        data = ''
+        tok = self.tokens.peek()
 
-        while not self.no_more_code():
-            ch = self.src[0]
-            self.src = self.src[1:]
-
-            if data + ch == orr:
-                return True
-
-            if ch in SEPARATORS:
-                self.src = ch + self.src
-                break
+        if tok is None:
+            return None
 
-            data += ch
+        if tok.text == orr:
+            self.tokens.pop()
+            return True
 
-        if len(data) == 0:
+        if tok.kind not in (TK_NAME, TK_BLOCK):
             return None
 
-        return VarName(data)
+        self.tokens.pop()
+        return VarName(tok.text)
 
     def pop_var_name_orr(self, *, orr:None|str) -> Literal[True]|VarName:
         name = self.popif_var_name(orr=orr)
@@ -272,12 +262,6 @@ class Src:
         assert name is not True
         return name
     
-    # the input of this needs to be the same as the output of `pop_var_name`
-    def unpop_var_name(self, name:None|Literal[True]|VarName) -> None:
-        if not isinstance(name, VarName):
-            return
-        self.src = name.to_str() + ' ' + self.src
-
     # pop: var name and type
 
     def pop_var_name_and_type_orr(self, *, orr:None|str=None) -> Literal[True]|tuple[VarName, Type]:
@@ -308,46 +292,29 @@ class Src:
         # TODO not taking care of `"`
         # TODO not taking care of \X
 
-        self.pop_whitespace()
-
-        in_string = False
-
-        value = ''
-
-        while not self.no_more_code():
-            ch = self.src[0]
-            self.src = self.src[1:]
+        tok = self.tokens.peek()
 
-            if value + ch == orr:
-                return True
-
-            if in_string:
-                value += ch
-                if ch == STRING:
-                    in_string = False
-                    break
-                continue
-
-            # not in string
-
-            if ch == STRING:
-                in_string = True
-                assert len(value) == 0
-                value += ch
-                continue
+        if tok is None:
+            msg = 'expected a value'
+            if orr is not None:
+                msg += f' or `{orr}`'
+            self.err(msg + ', instead got <end of file>')
 
-            if ch in SEPARATORS:
-                self.src = ch + self.src
-                break
+        if tok.text == orr:
+            self.tokens.pop()
+            return True
 
-            value += ch
+        if tok.kind == TK_SEP:
+            self.err(f'expected a value, instead got `{tok.text}`')
 
-        assert not in_string # should be unreachable
+        self.tokens.pop()
+        value = tok.text
 
-        if is_str(value):
+        if tok.kind == TK_STRING:
             return self.wrap_rawvalue(value, TYPE_COMPTIME_STR)
 
-        # TODO!!!! if is_num(value): ...
+        if tok.kind == TK_NUMBER:
+            return Value(self.gen_num(value))
 
         # `value` could be a value in itself or a function call
 
@@ -382,16 +349,9 @@ class Src:
         # TODO we're not taking care of string
         # TODO actually, anything with space doesnt work (like `(void * ) a` or `a + b`)
 
-        self.pop_whitespace()
-
-        if self.no_more_code():
+        if not self.tokens.popif(TUPLE_BEGIN):
             return None
 
-        if self.src[0] != TUPLE_BEGIN:
-            return None
-    
-        self.src = self.src[1:]
-
         the_tuple = ValueTuple()
         while True:
             item = self.pop_value_orr(orr=TUPLE_END)
@@ -414,20 +374,15 @@ class Src:
 
     # 1st return value is err, 2nd is what we got instead
     def pop_code_block_begin(self) -> tuple[bool,str]:
-        fn_body_begin = self.popif_var_name(orr=CODE_BLOCK_BEGIN)
-        self.unpop_var_name(fn_body_begin)
-
-        if fn_body_begin is True:
+        if self.tokens.popif(CODE_BLOCK_BEGIN):
             self.scope_enter()
             return False, ''
-        
-        if fn_body_begin is None:
-            return True, '<end of input reached>'
 
-        return True, fn_body_begin.to_str()
+        return True, self.tokens.peek_str()
 
     # made private since I don't want to deal with having to memorize to call `scope_leave` every time I call this
-    def _pop_code_block_element(self) -> None|CCode:
+    # returns None if there are no more statements in the block
+    def _pop_code_block_element(self) -> None|Statement:
         while True:
             statement_begin = self.pop_statement_beginning(orr=CODE_BLOCK_END)
 
@@ -439,10 +394,7 @@ class Src:
             # ret
 
             if statement_begin.matches_str(ST_BEG_RET):
-                ret = CCode('return ')
-                ret += self.pop_value().to_ccode() # TODO! fucking annotate `pop_var_name` and all those shits with YCodeValue or YCodeVarname or some shit like that
-                ret += CC_SEMICOLON_NL
-                return ret
+                return StRet(self.pop_value())
             
             # val/var
 
@@ -452,23 +404,14 @@ class Src:
 
                 var_value = self.pop_value()
             
-                return self.gen_ccode_var(var_name, var_type, var_value, const=statement_begin.matches_str(ST_BEG_VAL))
+                return StVar(var_name, var_type, var_value, const=statement_begin.matches_str(ST_BEG_VAL))
 
             # variable increase/decrease
 
             if statement_begin.matches_str(ST_BEG_INC) or statement_begin.matches_str(ST_BEG_DEC):
                 vn = self.pop_var_name()
-
-                c_var_name = vn.to_ccode()
-                c_value = self.pop_value().to_ccode()
-                c_change = CCode('+=') if statement_begin.matches_str(ST_BEG_INC) else CCode('-=')
-
-                ret = CCode('')
-                ret += c_var_name
-                ret += c_change
-                ret += c_value
-                ret += CC_SEMICOLON_NL
-                return ret
+                value = self.pop_value()
+                return StIncDec(vn, value, inc=statement_begin.matches_str(ST_BEG_INC))
             
             # cast
 
@@ -483,50 +426,24 @@ class Src:
 
                 previous_value = self.pop_value()
 
-                ret = CCode('') # TODO and what if it needs to be a constant ?
-                ret += new_c_type
-                ret += var.to_ccode()
-                ret += CC_ASSIGN
-                ret += CC_OB
-                ret += new_c_type
-                ret += CC_CB
-                ret += previous_value.to_ccode()
-                ret += CC_SEMICOLON_NL
-                return ret
+                return StCast(var, new_c_type, previous_value)
             
             # if
 
             if statement_begin.matches_str(ST_BEG_IF):
                 cond = self.pop_value()
 
-                err, code = self.pop_code_block()
+                err, instead_got = self.pop_code_block_begin()
                 if err:
-                    self.err(f'`{ST_BEG_IF}` statement: could not get code block `{CODE_BLOCK_BEGIN}`, instead got `{code}`')
-                assert isinstance(code, CCode) # make mypy happy
-
-                ret = CCode('if')
-                ret += CC_OB
-                ret += cond.to_ccode()
-                ret += CC_CB
-                ret += CC_CBO
-                ret += code
-                ret += CC_CBC
-                ret += CC_NL
-                return ret
+                    self.err(f'`{ST_BEG_IF}` statement: could not get code block `{CODE_BLOCK_BEGIN}`, instead got `{instead_got}`')
+
+                return StIf(cond, self.pop_code_block_nohead())
 
             # scope
 
             if statement_begin.matches_str(ST_BEG_SCOPE):
                 self.scope_enter() # since it was not called automatically
-                c_code = self.pop_code_block_nohead() # will call `self.scope_leave` automatically
-
-                ret = CCode('')
-                ret += CC_CBO
-                ret += CC_NL
-                ret += c_code
-                ret += CC_CBC
-                ret += CC_NL
-                return ret
+                return StScope(self.pop_code_block_nohead()) # will call `self.scope_leave` automatically
 
             # fn call
 
@@ -535,46 +452,47 @@ class Src:
             found, existing_sig = self.function_name_in_register(fn_name)
             if found:
                 # TODO!!! put an assert if the fnc can return an error, maybe take advantage of the c syntax `(val1ignored, val2ignored, val3actualvalue)`
-                # TODO!!! also, make this CCode fnc call code into its own function so that we can use it in that other place (the value popper or the tuple popper or whatever)
 
                 fn_call_args = self.pop_fn_call_args(fn_name)
                 fn_call = FnCall(fn_name, fn_call_args, existing_sig.get_ret_type(), existing_sig, self.warn, self.err) # yeah, this seems stupid but I want all fnc calls going trougn `FnCall` so that later we can pass the signature of the actual function and have shit checked
-
-                ret = fn_call.to_ccode()
-                ret += CC_SEMICOLON_NL
-                return ret
+                return StFnCall(fn_call)
             
             # invalid
 
+            if fn_name.to_str() in METATYPES:
+                # put it back, so that it gets parsed as the next top level item
+                self.tokens.seek(self.tokens.last_end - len(fn_name.to_str().encode()))
+                self.err(f'expected `{CODE_BLOCK_END}` before `{fn_name.to_str()}`')
+
             self.err(f'a valid statement beginning needs to be provided; those inclide {STATEMENT_BEGINNINGS}; this could also be a function call (could not find function `{fn_name.to_str()}`)')
 
-    def pop_code_block_nohead(self) -> CCode:
-        data = CCode('')
+    def pop_code_block_nohead(self) -> CodeBlock:
+        block = CodeBlock()
 
         while True:
-            body_element:None|CCode = self._pop_code_block_element()
-            if body_element is None:
+            statement_begin = self.tokens.last_end
+            try:
+                statement = self._pop_code_block_element()
+            except ParseError:
+                if not self.resync_statement(statement_begin):
+                    raise # the scopes get reset by `resync_top_level`
+                continue
+            if statement is None:
                 break
-
-            data += body_element
-
-        # this whole thing is kinda hacky, I know
-        if self.is_the_next_scope_leave_going_to_exit_the_function_body():
-            # TODO ideally we would do this on every scope leave but it too late and I really need to go to sleep
-
-            vars_code = CCode('')
-            for name, typ, value in self.unwrap_queue():
-                var = self.gen_ccode_var(name, typ, value) # var and not val since in the future we might actually want to edit that (pass it's address)
-                vars_code += var
-
-            vars_code += data # TODO just implement __add__ instead of using this stupid shit
-            data = vars_code
+            block.add_another(statement)
 
         self.scope_leave()
 
-        return data
+        return block
 
-    def pop_code_block(self) -> tuple[Literal[True],str] | tuple[Literal[False],CCode]:
+    # skips the rest of the statement that had an error, see `Lexer.skip_line`
+    # returns False if there's no next statement in the block, because the next top level item (or the end of file) comes first
+    def resync_statement(self, statement_begin:int) -> bool:
+        tok = self.tokens.skip_line(self.tokens.last_end == statement_begin, METATYPES)
+        return tok is not None and tok.text not in METATYPES
+
+    # 1st return value is err, 2nd is what we got instead
+    def pop_code_block(self) -> tuple[Literal[True],str] | tuple[Literal[False],CodeBlock]:
         err, instead_got = self.pop_code_block_begin()
         if err:
             return True, instead_got
@@ -597,10 +515,7 @@ class Src:
 
     # returns False if error
     def popif_fn_arg_begin(self) -> bool:
-        fn_arg_begin = self.popif_var_name(orr=FN_ARG_BEGIN)
-        self.unpop_var_name(fn_arg_begin)
-
-        return fn_arg_begin is True
+        return self.tokens.popif(FN_ARG_BEGIN)
 
     def pop_fn_arg_begin(self) -> None:
         assert self.popif_fn_arg_begin() is True
@@ -616,17 +531,18 @@ class Src:
         if not self.popif_fn_arg_begin():
             return None
 
-        args = FnDeclArgs()
+        args:list[tuple[VarName,Type]] = []
         while True:
             arg = self.pop_fn_def_arg_or_end()
             if arg is True:
                 break
 
-            err, reason = args.add_another(arg)
+            err, reason = FnDeclArgs.arg_can_be_added(args, arg)
             if err:
                 self.err(reason)
+            args.append(arg)
 
-        return args
+        return FnDeclArgs(tuple(args))
 
     def pop_fn_def_args(self) -> FnDeclArgs:
         ret = self.popif_fn_def_args()
@@ -654,32 +570,19 @@ class Src:
 
     # pop: fn body
 
-    def pop_fn_body(self, fn_name:FnName) -> CCode:
+    def pop_fn_body(self, fn_name:FnName) -> CodeBlock:
         err, data = self.pop_code_block()
         if err:
             self.err(f'function {fn_name.to_str()}: could not find function body `{CODE_BLOCK_BEGIN}`, instead got `{data}`')
-        assert isinstance(data, CCode) # make mypy happy
+        assert isinstance(data, CodeBlock) # make mypy happy
         return data
 
     # pop: macro
 
     def popif_macro_body(self) -> None|CCode:
-        self.pop_whitespace()
-
-        if self.no_more_code():
+        macro = self.tokens.popif_raw_enclosed(MACRO_BODY_BEGIN, MACRO_BODY_END)
+        if macro is None:
             return None
-        
-        if self.src[0] != MACRO_BODY_BEGIN:
-            return None
-
-        self.src = self.src[1:]
-
-        end = self.src.find(MACRO_BODY_END)
-        if end == -1:
-            self.err(f'could not find macro end `{MACRO_BODY_END}`')
-        
-        macro = self.src[:end]
-        self.src = self.src[end+1:]
 
         assert MACRO_BODY_BEGIN not in macro
 
@@ -687,6 +590,12 @@ class Src:
 
     # i don't even know anymore
 
+    def gen_num(self, text:str) -> Num:
+        try:
+            return Num(parse_num(text))
+        except ValueError as e:
+            self.err(f'number `{text}` {e}')
+
     def get_var_type(self, var:str) -> Type:
         if is_str(var):
             return TYPE_COMPTIME_STR
@@ -694,139 +603,394 @@ class Src:
         return self.get_registered_var_type(VarName(var))
 
     def scope_enter(self) -> None:
-        self.vars.append([])
+        self.vars.append({})
         self.scope_depth += 1
 
     def scope_leave(self) -> None:
+        for name in self.vars[-1]:
+            del self.var_scope[name]
         del self.vars[-1]
         self.scope_depth -= 1
         assert self.scope_depth >= 0
 
-    def is_the_next_scope_leave_going_to_exit_the_function_body(self) -> int:
-        return self.scope_depth == 2 # 2 because we also create another scope for the function arguments
-
     # creates a new "temporary" variable to put the given value in
     # then return that variable name
+    # the variable itself gets declared by the codegen, see `FnDefinition.strings`
     def wrap_rawvalue(self, rawvalue:str, typ:Type) -> Value:
-        name = VarName(f'$autogen{self.autogen_var_idx}$')
+        name = VarName(f'${self.autogen_prefix}{len(self.autogen_strings)}$')
 
         if typ.matches(TYPE_COMPTIME_STR):
             value = Value(Var(name.to_str(), TYPE_CSTR))
-            self.vars_for_auto_creation.append((name, typ, Value(Var(rawvalue, TYPE_COMPTIME_STR))))
+            self.autogen_strings.append((name, rawvalue))
         else:
             assert False
 
-        self.autogen_var_idx += 1
-
         return value
-    
-    def unwrap_queue(self) -> tuple[tuple[VarName,Type,Value], ...]:
-        ret = tuple(self.vars_for_auto_creation)
-        self.vars_for_auto_creation = []
-        return ret
-    
-    def gen_ccode_var(self, name:VarName, typ:Type, value:Value, const:bool=False) -> CCode:
-        const_prefix = CCode('const ') if const else CCode('') # TODO you can't make gcc raise a warning if a variable was declared without const but was not modified, so we need to do something about this in the future
-
-        ret = CCode('')
-        ret += const_prefix
-        ret += typ.to_ccode()
-        ret += CC_SPACE
-        ret += name.to_ccode()
-        ret += CC_ASSIGN
-        ret += value.to_ccode()
-        ret += CC_SEMICOLON_NL
+
+    def unwrap_strings(self) -> list[tuple[VarName,str]]:
+        ret = self.autogen_strings
+        self.autogen_strings = []
         return ret
 
-###
-### main
-###
+    # pop: top level
 
-def main() -> None:
+    def pop_fn_definition(self) -> FnDefinition:
 
-    os.makedirs(FOLDER_TMP, exist_ok=True)
+        # name and return type
 
-    with Src(FILE_INPUT, FILE_TMP_OUTPUT_UGLY) as src:
+        fn_name, fn_can_ret_err, fn_ret_type = self.pop_fn_name_and_canreterr_and_rettype()
 
-        # f_out.write('#include <stdio.h>\n')
-        # f_out.write('\n')
+        # args
 
-        while True:
+        args = self.pop_fn_def_args()
 
-            src.pop_whitespace()
+        self.scope_enter()
+        self.register_FnDeclArgs(args)
 
-            if src.no_more_code():
-                break
+        # fn names are unique across all the modules, so the names of the string variables are too;
+        # this also keeps them from depending on anything outside the fn, see `popif_cached_fn_definition`
+        self.autogen_prefix = f'{AUTOGEN_PREFIX}${fn_name.to_str()}$'
 
-            metatype = src.pop_var_metatype()
+        # register
 
-            if metatype.matches_str(MT_FN_DEF):
+        fn_sig = FnSignature(fn_name, fn_can_ret_err, fn_ret_type, args)
+        self.register_function_definition(fn_sig)
 
-                # name and return type
+        # body
 
-                fn_name, fn_can_ret_err, fn_ret_type = src.pop_fn_name_and_canreterr_and_rettype()
+        body_line = self.line_number
 
-                if fn_can_ret_err:
-                    src.write_ccode(CC_WARNUNUSEDRESULT_SPACE) # `-Wunused-result` doesn't do the trick
-                src.write_ccode(fn_ret_type.to_ccode())
-                src.write_ccode(CC_SPACE)
-                src.write_ccode(fn_name.to_ccode())
+        cache_key, cached = self.popif_cached_fn_definition(fn_sig, body_line)
+        if cached is not None:
+            self.scope_leave()
+            return cached
 
-                # args
+        warnings_before = len(self.diagnostics.warnings)
+        errors_before = len(self.diagnostics.errors)
 
-                args = src.pop_fn_def_args()
-                src.write_ccode(args.to_ccode())
+        body = self.pop_fn_body(fn_name)
 
-                src.scope_enter()
-                src.register_FnDeclArgs(args)
+        self.scope_leave()
+
+        fn = FnDefinition(fn_sig, args, body, self.unwrap_strings())
 
-                # register
+        if cache_key is not None and len(self.diagnostics.errors) == errors_before: # otherwise the errors would not show up the next time
+            self.cache_fn_definition(cache_key, fn, [(line - body_line, column, msg) for line, column, msg in self.diagnostics.warnings[warnings_before:]])
 
-                fn_sig = FnSignature(fn_name, fn_can_ret_err, fn_ret_type, args)
-                src.register_function_definition(fn_sig)
+        return fn
 
-                # body
+    # fn cache
+    # the parsed fn definitions are kept, keyed by the hash of the signature and the source of the body,
+    # along with the signatures of the fns the body calls; if any of those changes, the body needs to be parsed again
 
-                src.write_ccode(CCode('\n{\n'))
-                body = src.pop_fn_body(fn_name)
-                src.write_ccode(body)
-                src.write_ccode(CCode('\n}\n'))
+    # returns the cache key (None if the cache is disabled) and the cached definition if there's a valid one
+    # the lines of the cached warnings are relative to `body_line`
+    def popif_cached_fn_definition(self, fn_sig:FnSignature, body_line:int) -> tuple[None|str, None|FnDefinition]:
+        if self.fn_cache is None:
+            return None, None
 
-                src.scope_leave()
+        first = self.tokens.peek()
+        if first is None or first.text != CODE_BLOCK_BEGIN:
+            return None, None # let `pop_fn_body` complain
 
-            elif metatype.matches_str(MT_FN_DEC):
+        extent = self.tokens.pop_block()
+        if extent is None:
+            self.tokens.seek(first.begin)
+            return None, None
 
-                fn_name, fn_can_ret_err, ret_type = src.pop_fn_name_and_canreterr_and_rettype()
+        begin, end = extent
+        key = hashlib.sha256(f'{FN_CACHE_VERSION}\0{fn_sig!r}\0'.encode())
+        key.update(self.tokens.src[begin:end])
+        cache_key = key.hexdigest()
 
-                c_fn_name = fn_name.to_ccode()
+        data = self.fn_cache.get(cache_key)
+        if data is None:
+            self.tokens.seek(begin)
+            return cache_key, None
 
-                c_ret_type = ret_type.to_ccode()
+        try:
+            callees, warnings, fn = pickle.loads(data) # always a fresh copy, since the passes modify the syntax tree
+        except Exception: # pylint: disable=broad-exception-caught # a stale or broken entry can fail in all sorts of ways
+            self.tokens.seek(begin)
+            return cache_key, None
 
-                fn_args = src.pop_fn_dec_args()
-                # TODO!! the fact that this always returns CCode makes the error messages much less understandable
+        for name, sig in callees:
+            found, current = self.declared_functions.get_signature(FnName(name))
+            if not found or repr(current) != sig:
+                self.tokens.seek(begin)
+                return cache_key, None
 
-                fn_sig = FnSignature(fn_name, fn_can_ret_err, ret_type, fn_args)
-                src.register_function_declaration(fn_sig)
+        for line, column, msg in warnings:
+            self.warn(msg, body_line + line, column)
 
-                if fn_can_ret_err:
-                    src.write_ccode(CC_WARNUNUSEDRESULT_SPACE)
-                src.write_ccode(c_ret_type)
-                src.write_ccode(CC_SPACE)
-                src.write_ccode(c_fn_name)
-                src.write_ccode(fn_args) # we could have used `()` but unfortunately this doesnt work for stdlib fncs (line printf)
-                src.write_ccode(CC_SEMICOLON_NL)
+        fn.signature = fn_sig
+        return cache_key, fn
 
-            else:
-                
-                src.err(f'unknown metatype `{metatype}`; valid metatypes are {METATYPES}')
+    def cache_fn_definition(self, cache_key:str, fn:FnDefinition, warnings:list[tuple[int,int,str]]) -> None:
+        assert self.fn_cache is not None
+
+        callee_names:set[str] = set()
+        collect_calls(fn.body, callee_names)
+
+        callees = []
+        for name in sorted(callee_names):
+            found, sig = self.declared_functions.get_signature(FnName(name))
+            assert found
+            callees.append((name, repr(sig)))
+
+        self.fn_cache.put(cache_key, pickle.dumps((callees, warnings, fn)))
+
+    def pop_fn_declaration(self) -> FnDeclaration:
+        fn_name, fn_can_ret_err, ret_type = self.pop_fn_name_and_canreterr_and_rettype()
+
+        fn_args = self.pop_fn_dec_args()
+        # TODO!! the fact that this always returns CCode makes the error messages much less understandable
+
+        fn_sig = FnSignature(fn_name, fn_can_ret_err, ret_type, fn_args)
+        self.register_function_declaration(fn_sig)
+
+        return FnDeclaration(fn_sig, fn_args)
+
+    # the `import`s need to come before anything else, so that they can be found without parsing the whole file
+    # returns the paths of the imported modules
+    def pop_imports(self, search_path:list[str]) -> list[str]:
+        ret:list[str] = []
+
+        try:
+            while self.tokens.popif(MT_IMPORT):
+                try:
+                    path = self.pop_import(search_path)
+                except ParseError:
+                    continue
+
+                if path in ret:
+                    self.warn(f'module `{os.path.splitext(os.path.basename(path))[0]}` already imported')
+                else:
+                    ret.append(path)
+        except (ParseError, ErrorLimitReached):
+            pass # already reported
+
+        return ret
+
+    def pop_import(self, search_path:list[str]) -> str:
+        name = self.pop_var_name().to_str()
+
+        folders = list(dict.fromkeys([os.path.dirname(self.file_in)] + search_path))
+        for folder in folders:
+            path = os.path.realpath(os.path.join(folder, name + MODULE_EXTENSION))
+            if os.path.isfile(path):
+                return path
+
+        self.err(f'could not find module `{name}` in {folders}')
+
+    def pop_program(self) -> Program:
+        program = Program()
+
+        try:
+            while True:
+                try:
+                    if self.no_more_code():
+                        break
+                    self.pop_top_level(program)
+                except ParseError:
+                    self.resync_top_level()
+        except ErrorLimitReached:
+            pass # already reported
+
+        return program
+
+    def pop_top_level(self, program:Program) -> None:
+        metatype = self.pop_var_metatype()
+
+        if metatype.matches_str(MT_FN_DEF):
+            program.add_another(self.pop_fn_definition())
+
+        elif metatype.matches_str(MT_FN_DEC):
+            program.add_another(self.pop_fn_declaration())
+
+        elif metatype.matches_str(MT_IMPORT):
+            if len(program.items) > 0:
+                self.err(f'`{MT_IMPORT}`s need to come before everything else')
+            self.pop_var_name() # already taken care of by `pop_imports`
+
+        else:
+            self.err(f'unknown metatype `{metatype.to_str()}`; valid metatypes are {METATYPES}')
+
+    # skips to the next top level item, forgetting about the fn that had the error
+    def resync_top_level(self) -> None:
+        self.vars = [{}]
+        self.var_scope = {}
+        self.scope_depth = 0
+        self.autogen_strings = []
+
+        self.tokens.skip_until(METATYPES)
+
+###
+### modules
+###
+
+# returns the module's syntax tree, the signatures of the fns it defines, what it added to `stats.counters`
+# (which is only of interest when this runs in another process), and the number of errors
+def parse_module(file_in:str, imported_functions:list[FnSignature], fn_cache:None|FnCache, max_errors:None|int, out:None|TextIO=None) -> tuple[Program, list[FnSignature], collections.Counter[str], int]:
+    counters_before = stats.counters.copy()
+    with Src(file_in, imported_functions, fn_cache, max_errors, out) as src:
+        program = src.pop_program()
+    # not taken from `program`, so that the fns that had an error in them don't lead to more errors in the modules that import them
+    exports = list(src.defined_functions.fns.values())
+    return program, exports, stats.counters - counters_before, len(src.diagnostics.errors)
+
+# parses `file_in` and everything it imports, the modules that don't depend on each other get parsed in parallel
+# returns all of them merged into one program, with every module coming after the modules it imports
+# if there were any errors, exits once all of them have been reported
+def pop_modules(file_in:str, search_path:list[str], fn_cache:None|FnCache=None, max_errors:None|int=MAX_ERRORS) -> Program:
+    file_in = os.path.realpath(file_in)
+
+    imports, errors = scan_imports(file_in, search_path, max_errors)
+
+    # parsing with modules missing would only lead to a bunch of bogus errors about their fns
+    if errors > 0:
+        exit_with_errors(errors)
+
+    order = sort_modules(file_in, imports)
+
+    if len(order) == 1:
+        program, _exports, _counters, errors = parse_module(file_in, [], fn_cache, max_errors)
+        if errors > 0:
+            exit_with_errors(errors)
+        return program
+
+    parsed, errors = parse_modules(order, imports, fn_cache, max_errors)
+    if errors > 0:
+        exit_with_errors(errors)
+
+    return merge_modules([parsed[path][0] for path in order], order)
+
+# returns the paths of the modules that `file_in` and everything it imports import, and the number of errors
+def scan_imports(file_in:str, search_path:list[str], max_errors:None|int, out:None|TextIO=None) -> tuple[dict[str,list[str]], int]:
+    errors = 0
+
+    imports:dict[str,list[str]] = {} # module path -> paths of the modules it imports
+    todo = [file_in]
+    while len(todo) > 0:
+        path = todo.pop()
+        if path in imports:
+            continue
+        with Src(path, max_errors=max_errors, out=out) as src:
+            imports[path] = src.pop_imports(search_path)
+        errors += len(src.diagnostics.errors)
+        todo.extend(imports[path])
+
+    return imports, errors
+
+# parses the modules in `order` (see `sort_modules`), the ones that don't depend on each other in parallel
+# returns what `parse_module` returned for each of them, and the total number of errors
+def parse_modules(order:list[str], imports:dict[str,list[str]], fn_cache:None|FnCache, max_errors:None|int) -> tuple[dict[str,tuple[Program,list[FnSignature],collections.Counter[str],int]], int]:
+    errors = 0
+    parsed:dict[str,tuple[Program,list[FnSignature],collections.Counter[str],int]] = {}
+    running:dict[Future[tuple[Program,list[FnSignature],collections.Counter[str],int]],str] = {}
+
+    with ProcessPoolExecutor() as pool:
+        while len(parsed) < len(order):
+            if max_errors is not None and errors >= max_errors:
+                break # the ones that are running still get waited for
+
+            for path in order:
+                if path in parsed or path in running.values():
+                    continue
+                if not all(dep in parsed for dep in imports[path]):
+                    continue
+
+                imported_functions:dict[str,FnSignature] = {}
+                for dep in imports[path]:
+                    for fn in parsed[dep][1]:
+                        imported_functions.setdefault(fn.name.to_str(), fn) # duplicates get reported when merging
+                max_errors_left = None if max_errors is None else max_errors - errors
+
+                running[pool.submit(parse_module, path, list(imported_functions.values()), fn_cache, max_errors_left)] = path
+
+            done, _pending = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = running.pop(future)
+                parsed[path] = future.result()
+                stats.counters.update(parsed[path][2])
+                errors += parsed[path][3]
+
+    return parsed, errors
+
+###
+### main
+###
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=f'compiles `{os.path.basename(FILE_INPUT)}` and runs it')
+    parser.add_argument('--profile', choices=BUILD_PROFILES, default=DEFAULT_BUILD_PROFILE, help=f'default: {DEFAULT_BUILD_PROFILE}')
+    parser.add_argument('--train-input', help='file to feed to the training run of the `pgo` profile (and to the runs of `--compare-profiles`)')
+    parser.add_argument('--compare-profiles', action='store_true', help='build and run with every profile, and report the times')
+    parser.add_argument('--shared', action='store_true', help=f'build a shared library (`{os.path.basename(FILE_LIBRARY)}`) instead of an executable, and don\'t run anything')
+    parser.add_argument('--export', action='append', default=[], help='a fn that needs to be visible outside of the generated C, on top of `main`; can be given multiple times')
+    parser.add_argument('--units', type=int, default=TRANSLATION_UNITS, help=f'number of translation units to split the C code into, to be compiled in parallel; default: {TRANSLATION_UNITS}')
+    parser.add_argument('--no-pretty', dest='pretty', action='store_false', default=PRETTY_C, help='don\'t indent the generated C, which saves a bit of time when nobody is going to read it')
+    parser.add_argument('--time-phases', nargs='?', const='text', choices=['text', 'json'], help='report the wall and cpu time of each phase, and the counters of the hot paths')
+    parser.add_argument('--time-phases-out', help='file to write the `--time-phases` report to; default: stderr')
+    parser.add_argument('--max-errors', type=int, default=MAX_ERRORS, help='stop parsing a module after this many errors; default: no limit')
+    parser.add_argument('--cprofile', action='store_true', help='profile the compiler (not including the parser processes) and print the hottest fns')
+    parser.add_argument('--tracemalloc', action='store_true', help='trace the memory allocations of the compiler and print the biggest ones')
+    args = parser.parse_args()
+
+    if args.units < 1:
+        parser.error('--units needs to be at least 1')
+    if args.max_errors is not None and args.max_errors < 1:
+        parser.error('--max-errors needs to be at least 1')
+    if args.shared and (args.profile == 'pgo' or args.compare_profiles):
+        parser.error('--shared can\'t be used with the `pgo` profile, nor with --compare-profiles')
+
+    times = PhaseTimes()
+
+    try:
+        with stats.profiled(args.cprofile, args.tracemalloc):
+            compile_and_run(args, times)
+    finally:
+        if args.time_phases is not None:
+            times.write(args.time_phases, args.time_phases_out)
+
+def compile_and_run(args:argparse.Namespace, times:PhaseTimes) -> None:
+    os.makedirs(FOLDER_TMP, exist_ok=True)
+
+    with times.phase('parse'):
+        program = pop_modules(FILE_INPUT, MODULE_SEARCH_PATH, FnCache(FOLDER_FN_CACHE, FN_CACHE_MAX_BYTES), args.max_errors)
+        check_exports(program, args.export)
+
+    with times.phase('fold constants'):
+        fold_constants(program)
+
+    with times.phase('drop unreachable'):
+        for item in drop_unreachable_functions(program, EXPORTS + args.export):
+            metatype = MT_FN_DEF if isinstance(item, FnDefinition) else MT_FN_DEC
+            print(f'INFO: dropped unreachable `{metatype} {item.signature.name.to_str()}`', file=sys.stderr)
+
+    with times.phase('linkage'):
+        set_linkage(program, EXPORTS + args.export, INLINE_THRESHOLD)
+
+    with times.phase('codegen'):
+        sources = gen_c(program, FOLDER_TMP, args.units, args.pretty)
+
+    builder = Builder(ArtifactCache(FOLDER_GCC_CACHE, GCC_CACHE_MAX_BYTES), FILE_EXECUTABLE, FOLDER_PGO)
+
+    if args.shared:
+        with times.phase('gcc'):
+            builder.build_shared(args.profile, sources, FILE_LIBRARY)
+        return
 
-    shutil.copyfile(FILE_TMP_OUTPUT_UGLY, FILE_TMP_OUTPUT)
-    # term(['clang-format', '-i', FILE_TMP_OUTPUT]) # uses 2 spaces
-    term(['astyle', FILE_TMP_OUTPUT]) # ok
-    # term(['uncrustify', FILE_TMP_OUTPUT]) # requires a config file
+    if args.compare_profiles:
+        with times.phase('compare profiles'):
+            builder.compare_profiles(sources, args.train_input)
+        return
 
-    term(['gcc', '-Werror', '-Wextra', '-Wall', '-pedantic', '-Wfatal-errors', '-Wshadow', '-fwrapv', '-o', FILE_EXECUTABLE, FILE_TMP_OUTPUT])
+    with times.phase('gcc'):
+        builder.build(args.profile, sources, args.train_input)
 
-    term([FILE_EXECUTABLE])
+    with times.phase('run'):
+        builder.run()
 
-main()
+if __name__ == '__main__':
+    main()